@@ -0,0 +1,162 @@
+"""In-memory answer cache with exact and embedding-similarity lookup.
+
+Answers are grouped by a namespace (the LLM model and temperature that produced them) so a cached
+answer is only reused for requests that would have been generated the same way.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key."""
+    text = _PUNCT_RE.sub(" ", (query or "").lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class _Entry:
+    __slots__ = ("namespace", "response", "vector", "created_at")
+
+    def __init__(self, namespace: Hashable, response: str, vector: Optional[np.ndarray]):
+        self.namespace = namespace
+        self.response = response
+        self.vector = vector
+        self.created_at = time.monotonic()
+
+
+class SemanticAnswerCache:
+    """Bounded LRU cache of answers with TTL expiry.
+
+    Lookups first try the normalized query text and then, when a query embedding is available,
+    the most similar cached query (cosine similarity >= `similarity_threshold`) in the same namespace.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0,
+                 similarity_threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        # (namespace, normalized query) -> _Entry, oldest first
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        # namespace -> (keys, stacked unit vectors); rebuilt lazily after mutations
+        self._matrices: Dict[Hashable, tuple] = {}
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry.created_at > self.ttl_seconds
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._matrices.pop(entry.namespace, None)
+
+    def _matrix_for(self, namespace: Hashable):
+        cached = self._matrices.get(namespace)
+        if cached is None:
+            keys: List[tuple] = []
+            vectors = []
+            for key, entry in self._entries.items():
+                if entry.namespace == namespace and entry.vector is not None:
+                    keys.append(key)
+                    vectors.append(entry.vector)
+            matrix = np.vstack(vectors) if vectors else None
+            cached = (keys, matrix)
+            self._matrices[namespace] = cached
+        return cached
+
+    def lookup_exact(self, query: str, namespace: Hashable) -> Optional[str]:
+        """Return a cached answer for the same normalized query, without counting a miss."""
+        key = (namespace, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.monotonic()):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.response
+
+    def lookup_similar(self, query: str, namespace: Hashable,
+                       vector: Sequence[float]) -> Optional[str]:
+        """Return the answer of the most similar cached query, or None (counted as a miss)."""
+        with self._lock:
+            # The exact key may have been stored since the caller's exact lookup
+            key = (namespace, normalize_query(query))
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, time.monotonic()):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.response
+
+            keys, matrix = self._matrix_for(namespace)
+            if matrix is not None:
+                scores = matrix @ self._unit(vector)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    best_key = keys[best]
+                    entry = self._entries[best_key]
+                    if not self._expired(entry, time.monotonic()):
+                        self._entries.move_to_end(best_key)
+                        self.semantic_hits += 1
+                        return entry.response
+                    self._remove(best_key)
+
+            self.misses += 1
+            return None
+
+    def store(self, query: str, namespace: Hashable, response: str,
+              vector: Optional[Sequence[float]] = None) -> None:
+        """Insert or refresh an answer, evicting the least recently used entries when full."""
+        key = (namespace, normalize_query(query))
+        unit = self._unit(vector) if vector is not None else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(namespace, response, unit)
+            self._matrices.pop(namespace, None)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached answer (e.g. after a model switch or index rebuild)."""
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
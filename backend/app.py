@@ -1,9 +1,14 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from retriever import MedicalRetriever
+from live_index import IndexValidationError
 from ollama_client import list_models
+import batch
 import config
+import json
+import metrics
 import os
+import time
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
@@ -20,6 +25,29 @@ try:
 except Exception as e:
     print(f"❌ Error initializing retriever: {str(e)}")
 
+CHAT_ROUTES = ('/chat', '/chat/stream', '/chat/batch')
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    """Count chat requests and observe their latency (for streams: time until headers are sent)."""
+    if request.path in CHAT_ROUTES and 'request_started' in g:
+        metrics.HTTP_REQUESTS.inc(request.path, str(response.status_code))
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - g.request_started, request.path)
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of the per-stage latency metrics."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 # Serve frontend
 @app.route('/')
 def index():
@@ -116,7 +144,9 @@ def set_models():
     return a clear error. We no longer try to validate against cached lists first.
     """
     try:
-        data = request.get_json() or {}
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object', 'success': False}), 400
         new_llm = data.get('llm_model')
 
         if not retriever:
@@ -143,39 +173,200 @@ def set_models():
         return jsonify({'error': 'Internal server error', 'success': False}), 500
 
 
+@app.route('/admin/reload-index', methods=['POST'])
+def reload_index():
+    """Load the index currently on disk and swap it in; chats keep being served throughout."""
+    if not retriever:
+        return jsonify({'error': 'Retriever not initialized', 'success': False}), 500
+    try:
+        result = retriever.reload_index()
+    except IndexValidationError as e:
+        return jsonify({'error': str(e), 'success': False}), 409
+    except Exception as e:
+        print(f"❌ Index reload failed: {e}")
+        return jsonify({'error': f"Failed to load index: {str(e)}", 'success': False}), 500
+    return jsonify({**result, 'success': True})
+
+
+def _generation_options(data: dict) -> dict:
+    """Extract per-request generation options (temperature, llm_model, k, session_id) from a chat payload.
+
+    Raises ValueError with a user-facing message when an option is malformed.
+    """
+    options = {}
+    temperature = data.get('temperature', config.DEFAULT_TEMPERATURE)
+    try:
+        options['temperature'] = float(temperature)
+    except (TypeError, ValueError):
+        raise ValueError('temperature must be a number')
+
+    llm_model = data.get('llm_model')
+    if llm_model is not None:
+        if not isinstance(llm_model, str) or not llm_model:
+            raise ValueError('llm_model must be a non-empty string')
+        options['llm_model'] = llm_model
+
+    k = data.get('k')
+    if k is not None:
+        if not isinstance(k, int) or not 1 <= k <= config.MAX_RETRIEVAL_K:
+            raise ValueError(f'k must be an integer between 1 and {config.MAX_RETRIEVAL_K}')
+        options['k'] = k
+
+    session_id = data.get('session_id')
+    if session_id is not None:
+        if not isinstance(session_id, str) or not 0 < len(session_id) <= 128:
+            raise ValueError('session_id must be a string of at most 128 characters')
+        options['session_id'] = session_id
+    return options
+
+
 # Chat route
 @app.route('/chat', methods=['POST'])
 def chat():
     """Handle chat requests"""
     try:
-        data = request.get_json()
-        if not data or 'query' not in data:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'query' not in data:
             return jsonify({'error': 'No query provided', 'success': False}), 400
 
         query = data['query']
-        temperature = data.get('temperature', config.DEFAULT_TEMPERATURE)
+        try:
+            options = _generation_options(data)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
 
         if not retriever:
             return jsonify({'error': 'Retriever not initialized', 'success': False}), 500
 
         # response = retriever.get_answer(query, temperature)
         # return jsonify({'response': response, 'success': True})
-        result = retriever.get_answer(query, temperature)
-        if isinstance(result, dict) and "response" in result:
-            result = result["response"]
-        print(f"✅ Response generated successfully")
-        print(f"Response: {result}")
-        return jsonify({"response": result, "success": True})
+        result = retriever.get_answer(query, **options)
+        if not result["success"]:
+            print(f"❌ Generation failed: {result['error']}")
+            return jsonify({'response': result['response'], 'error': result['error'], 'success': False}), 500
+        timings = result.get("timings", {})
+        print(f"✅ Response generated successfully ({timings.get('total', 0):.0f} ms)")
+        payload = {"response": result["response"], "success": True, "timings": timings}
+        for flag in ("cached", "coalesced"):
+            if result.get(flag):
+                payload[flag] = True
+        response = jsonify(payload)
+        if timings:
+            response.headers['Server-Timing'] = metrics.server_timing(timings)
+        return response
 
     except Exception as e:
         print(f"❌ Error processing request: {str(e)}")
         return jsonify({'error': 'Internal server error', 'success': False}), 500
 
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat requests, streaming the answer as server-sent events.
+
+    Each event is a JSON object on a `data:` line: first the retrieved `sources`, then one `token`
+    event per generated chunk, and finally `done` (with per-stage `timings`) or `error`.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'query' not in data:
+        return jsonify({'error': 'No query provided', 'success': False}), 400
+
+    if not retriever:
+        return jsonify({'error': 'Retriever not initialized', 'success': False}), 500
+
+    query = data['query']
+    try:
+        options = _generation_options(data)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+    def generate():
+        for event in retriever.stream_answer(query, **options):
+            yield f"data: {json.dumps(event)}\n\n"
+        print("✅ Streamed response finished")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies (nginx) from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def _batch_request(body: str, content_type: str, args) -> tuple:
+    """Parse a `/chat/batch` request into (items, options).
+
+    A JSON body is `{"queries": [...], ...options}`; any other body is JSONL with one item per line,
+    options then come from the query string. Raises ValueError with a user-facing message.
+    """
+    if content_type == 'application/json':
+        try:
+            data = json.loads(body or 'null')
+        except ValueError:
+            raise ValueError('Invalid JSON body')
+        if not isinstance(data, dict) or not isinstance(data.get('queries'), list):
+            raise ValueError('Expected {"queries": [...]} or a JSONL body')
+        records, source = data['queries'], {**args, **data}
+    else:
+        records, source = batch.parse_jsonl(body or ''), dict(args)
+    for name in ('k', 'max_parallel'):
+        # Query-string values arrive as text
+        if isinstance(source.get(name), str):
+            try:
+                source[name] = int(source[name])
+            except ValueError:
+                raise ValueError(f'{name} must be an integer')
+
+    options = _generation_options(source)
+    options.pop('session_id', None)
+    max_parallel = source.get('max_parallel')
+    if max_parallel is not None:
+        if not isinstance(max_parallel, int) or not 1 <= max_parallel <= config.BATCH_MAX_PARALLEL:
+            raise ValueError(f'max_parallel must be an integer between 1 and {config.BATCH_MAX_PARALLEL}')
+        options['max_parallel'] = max_parallel
+    return batch.parse_items(records, config.BATCH_MAX_ITEMS), options
+
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer many questions in one request, streaming one JSON result per line as each completes."""
+    if not retriever:
+        return jsonify({'error': 'Retriever not initialized', 'success': False}), 500
+    try:
+        items, options = _batch_request(request.get_data(as_text=True), request.mimetype, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+    def generate():
+        for result in retriever.answer_batch(items, **options):
+            yield json.dumps(result) + "\n"
+        print(f"✅ Batch of {len(items)} questions finished")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def wait_for_models():
+    """Hold server startup until the startup warm-up has loaded the models (or timed out)."""
+    if retriever and config.WARMUP_ON_STARTUP:
+        print("⏳ Loading models into Ollama...")
+        if not retriever.warmer.wait(config.WARMUP_TIMEOUT):
+            print(f"⚠️ Models not ready after {config.WARMUP_TIMEOUT}s; starting anyway")
+
+
 if __name__ == '__main__':
+    wait_for_models()
     print(f"\n🚀 Starting server at: http://{config.FLASK_HOST}:{config.FLASK_PORT}\n")
     app.run(
         host=config.FLASK_HOST,
         port=config.FLASK_PORT,
-        debug=True
+        debug=True,
+        # Requests share no mutable generation state, so serve them concurrently
+        threaded=True
     )
@@ -0,0 +1,312 @@
+"""Asyncio serving mode: the same `/chat`, `/chat/stream`, `/chat/batch`, `/models`, `/metrics` and static routes as `app.py`,
+served by an ASGI app so waiting on Ollama does not hold a thread per request.
+
+Run with `python backend/asgi_app.py` (or `uvicorn asgi_app:app --app-dir backend`).
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+# Share the retriever instance and request validation with the Flask app
+from app import retriever, _batch_request, _generation_options, _is_embedding_model, wait_for_models
+from live_index import IndexValidationError
+from ollama_client import AsyncOllamaClient
+import config
+import metrics
+
+
+FRONTEND_DIR = os.path.join(config.BASE_DIR, "frontend")
+
+
+class Saturated(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status to return."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AdmissionGate:
+    """Bounded in-flight limit with a bounded wait queue.
+
+    At most `max_concurrency` chats run at once and at most `max_queue` wait for a slot. A request
+    arriving to a full queue is rejected with 429; one that waits longer than `queue_timeout`
+    seconds is rejected with 503.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._active = 0
+        self.rejected = 0
+
+    async def acquire(self) -> None:
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise Saturated(429, "Too many requests queued, please retry shortly")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Saturated(503, "Server busy, please retry shortly")
+        finally:
+            self._waiting -= 1
+        self._active += 1
+
+    def release(self) -> None:
+        self._active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected
+        }
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """A `StreamingResponse` that calls `release` once it is over, however it ends.
+
+    Unlike a `finally` in the body generator, this also runs when the client disconnects before
+    the body starts streaming (the generator then never runs).
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+gate = AdmissionGate(config.ASYNC_MAX_CONCURRENCY, config.ASYNC_MAX_QUEUE, config.ASYNC_QUEUE_TIMEOUT)
+ollama = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global ollama
+    ollama = AsyncOllamaClient(
+        config.OLLAMA_BASE_URL,
+        max_connections=config.OLLAMA_MAX_CONNECTIONS,
+        timeout=config.OLLAMA_TIMEOUT,
+        keep_alive=config.OLLAMA_KEEP_ALIVE
+    )
+    # Connections are only accepted once startup completes, so no chat hits a cold model
+    await asyncio.to_thread(wait_for_models)
+    try:
+        yield
+    finally:
+        await ollama.close()
+
+
+def _error(message: str, status_code: int) -> JSONResponse:
+    return JSONResponse({'error': message, 'success': False}, status_code=status_code)
+
+
+def _observed(handler):
+    """Count a chat route's requests and observe latency (for streams: time until headers are sent)."""
+    async def wrapper(request: Request):
+        started = time.perf_counter()
+        response = await handler(request)
+        metrics.HTTP_REQUESTS.inc(request.url.path, str(response.status_code))
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, request.url.path)
+        return response
+    return wrapper
+
+
+async def _parse_chat_request(request: Request):
+    """Validate a chat payload; returns (query, options) or a JSONResponse describing the error."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'query' not in data:
+        return _error('No query provided', 400)
+    if not retriever:
+        return _error('Retriever not initialized', 500)
+    try:
+        options = _generation_options(data)
+    except ValueError as e:
+        return _error(str(e), 400)
+    return data['query'], options
+
+
+async def metrics_endpoint(request: Request):
+    """Prometheus text exposition of the per-stage latency metrics."""
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+async def index(request: Request):
+    """Serve main HTML page"""
+    return FileResponse(os.path.join(FRONTEND_DIR, 'index.html'))
+
+
+async def get_models(request: Request):
+    """Return available generative models (filter out embedding models)."""
+    raw_models = await ollama.list_models()
+    models = [m for m in raw_models if not _is_embedding_model(m)]
+    state = retriever.get_state() if retriever else {}
+    if state:
+        state["admission"] = gate.stats()
+    return JSONResponse({"models": models, "state": state, "success": True})
+
+
+async def set_models(request: Request):
+    """Set the LLM model at runtime (same contract as the Flask route)."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        return _error('Expected a JSON object', 400)
+    new_llm = data.get('llm_model')
+
+    if not retriever:
+        return _error('Retriever not initialized', 500)
+    if not isinstance(new_llm, str):
+        return _error('llm_model must be a string', 400)
+
+    try:
+        await asyncio.to_thread(retriever.update_llm, new_llm)
+    except Exception as e_apply:
+        print(f"❌ Failed to apply LLM '{new_llm}': {e_apply}")
+        return _error(f"Failed to apply model: {str(e_apply)}", 400)
+
+    config.LLM_MODEL_NAME = new_llm
+    config.SELECTED_LLM_MODELS = [new_llm]
+    return JSONResponse({'state': retriever.get_state(), 'success': True})
+
+
+async def reload_index(request: Request):
+    """Load the index currently on disk and swap it in (same contract as the Flask route)."""
+    if not retriever:
+        return _error('Retriever not initialized', 500)
+    try:
+        result = await asyncio.to_thread(retriever.reload_index)
+    except IndexValidationError as e:
+        return _error(str(e), 409)
+    except Exception as e:
+        print(f"❌ Index reload failed: {e}")
+        return _error(f"Failed to load index: {str(e)}", 500)
+    return JSONResponse({**result, 'success': True})
+
+
+async def chat(request: Request):
+    """Handle chat requests"""
+    parsed = await _parse_chat_request(request)
+    if isinstance(parsed, JSONResponse):
+        return parsed
+    query, options = parsed
+
+    try:
+        await gate.acquire()
+    except Saturated as e:
+        return _error(str(e), e.status_code)
+    try:
+        result = await retriever.aget_answer(ollama, query, **options)
+    finally:
+        gate.release()
+    if not result["success"]:
+        print(f"❌ Generation failed: {result['error']}")
+        return JSONResponse({'response': result['response'], 'error': result['error'], 'success': False},
+                            status_code=500)
+    timings = result.get("timings", {})
+    payload = {"response": result["response"], "success": True, "timings": timings}
+    for flag in ("cached", "coalesced"):
+        if result.get(flag):
+            payload[flag] = True
+    headers = {'Server-Timing': metrics.server_timing(timings)} if timings else None
+    return JSONResponse(payload, headers=headers)
+
+
+async def chat_stream(request: Request):
+    """Handle chat requests, streaming the answer as server-sent events."""
+    parsed = await _parse_chat_request(request)
+    if isinstance(parsed, JSONResponse):
+        return parsed
+    query, options = parsed
+
+    try:
+        await gate.acquire()
+    except Saturated as e:
+        return _error(str(e), e.status_code)
+
+    async def generate():
+        async for event in retriever.astream_answer(ollama, query, **options):
+            yield f"data: {json.dumps(event)}\n\n"
+
+    # The slot is held until the last token is sent (or the client disconnects)
+    return SlotStreamingResponse(
+        generate(),
+        gate.release,
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def chat_batch(request: Request):
+    """Answer many questions in one request (same contract as the Flask route).
+
+    Batch generations are bounded by their own `max_parallel`, not by the admission gate.
+    """
+    if not retriever:
+        return _error('Retriever not initialized', 500)
+    body = (await request.body()).decode('utf-8', errors='replace')
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    try:
+        items, options = _batch_request(body, content_type, request.query_params)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+    async def generate():
+        async for result in retriever.aanswer_batch(ollama, items, **options):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/models', get_models, methods=['GET']),
+        Route('/models', set_models, methods=['POST']),
+        Route('/admin/reload-index', reload_index, methods=['POST']),
+        Route('/chat', _observed(chat), methods=['POST']),
+        Route('/chat/stream', _observed(chat_stream), methods=['POST']),
+        Route('/chat/batch', _observed(chat_batch), methods=['POST']),
+        Route('/metrics', metrics_endpoint),
+        Mount('/', StaticFiles(directory=FRONTEND_DIR), name='static'),
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print(f"\n🚀 Starting async server at: http://{config.FLASK_HOST}:{config.FLASK_PORT}\n")
+    uvicorn.run(app, host=config.FLASK_HOST, port=config.FLASK_PORT)
@@ -0,0 +1,61 @@
+"""Input parsing for `/chat/batch` (bulk question runs, e.g. offline evaluations).
+
+A batch is a list of items, each a plain string or an object with an optional id and the question:
+`query` or `question`, or `title` plus `body` (the shape of `requests.jsonl` work orders, whose
+`request_id` becomes the id). Items without an id are numbered by position.
+"""
+
+import json
+from typing import Any, Iterable, List, NamedTuple
+
+
+QUERY_FIELDS = ("query", "question")
+ID_FIELDS = ("id", "request_id")
+
+
+class BatchItem(NamedTuple):
+    id: Any
+    query: str
+
+
+def parse_jsonl(text: str) -> List[Any]:
+    """One record per non-empty line: a JSON value, or the line itself when it is not JSON."""
+    records = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            records.append(line)
+    return records
+
+
+def _question(record: dict) -> str:
+    for field in QUERY_FIELDS:
+        if isinstance(record.get(field), str):
+            return record[field]
+    parts = [record.get(field) for field in ("title", "body")]
+    return "\n".join(part for part in parts if isinstance(part, str))
+
+
+def parse_items(records: Iterable[Any], max_items: int) -> List[BatchItem]:
+    """Validate batch records; raises ValueError with a user-facing message."""
+    items = []
+    for position, record in enumerate(records):
+        if isinstance(record, str):
+            item_id, query = position, record
+        elif isinstance(record, dict):
+            item_id = next((record[f] for f in ID_FIELDS if record.get(f) is not None), position)
+            query = _question(record)
+        else:
+            raise ValueError(f"item {position} must be a string or an object")
+        if not query.strip():
+            raise ValueError(f"item {position} has no query")
+        items.append(BatchItem(item_id, query.strip()))
+        if len(items) > max_items:
+            raise ValueError(f"a batch holds at most {max_items} items")
+    if not items:
+        raise ValueError("No queries provided")
+    return items
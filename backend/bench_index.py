@@ -0,0 +1,135 @@
+"""Benchmark FAISS index types (latency, memory, recall@k against exact flat search).
+
+Uses the vectors of the current flat index in `data/faiss_index` by default, or a synthetic
+clustered corpus to estimate behaviour at sizes we don't have yet:
+
+    python backend/bench_index.py --k 3
+    python backend/bench_index.py --synthetic 200000 --dim 768 --types flat ivf_flat ivf_pq hnsw
+
+With `--shards`, it instead measures how single-query latency scales when the vectors are split
+over that many shards searched in parallel (`FAISS_SHARDS`):
+
+    python backend/bench_index.py --synthetic 1000000 --dim 768 --types flat hnsw --shards 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+import config
+import vector_index
+
+
+def load_index_vectors() -> np.ndarray:
+    """Read every vector back out of the index on disk (must support reconstruction, e.g. flat)."""
+    try:
+        with open(config.FAISS_META_FILE, "r", encoding="utf-8") as mf:
+            shards = json.load(mf).get("shards", 1)
+    except (OSError, ValueError):
+        shards = 1
+    index = vector_index.read_index(config.FAISS_INDEX_PATH, mmap=False, shards=shards)
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        raise SystemExit("The index on disk cannot return its vectors; rebuild it with FAISS_INDEX_TYPE='flat' or use --synthetic")
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, roughly shaped like text embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 200), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of random corpus vectors (queries near, but not equal to, real chunks)."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), n)] + 0.05 * rng.standard_normal((n, vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def benchmark(index_type: str, vectors: np.ndarray, queries: np.ndarray, k: int,
+              truth: np.ndarray = None, shards: int = 1) -> dict:
+    params = vector_index.index_params(index_type, num_train=min(len(vectors), config.FAISS_TRAIN_SIZE))
+    start = time.perf_counter()
+    train = vectors[:config.FAISS_TRAIN_SIZE] if vector_index.needs_training(index_type) else None
+    index = vector_index.make_sharded(vector_index.build_index(vectors.shape[1], params, train), shards)
+    index.add(vectors)
+    build_s = time.perf_counter() - start
+
+    # One query at a time, as the server issues them
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        t0 = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - t0)
+        found[i] = ids[0]
+    latencies_ms = np.array(latencies) * 1000
+
+    result = {
+        "type": index_type,
+        "shards": shards,
+        "build_s": build_s,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "memory_mb": vector_index.index_memory_bytes(index) / 1e6,
+        "recall": 1.0,
+        "ids": found
+    }
+    if truth is not None:
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+        result["recall"] = hits / truth.size
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index types against exact search.")
+    parser.add_argument("--types", nargs="+", default=list(vector_index.INDEX_TYPES), choices=vector_index.INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=config.RETRIEVAL_K)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--synthetic", type=int, metavar="N", help="benchmark N synthetic vectors instead of the index on disk")
+    parser.add_argument("--dim", type=int, default=768, help="dimension of synthetic vectors")
+    parser.add_argument("--shards", type=int, nargs="+", metavar="N",
+                        help="compare these shard counts for each index type instead of comparing types")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic, args.dim) if args.synthetic else load_index_vectors()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = make_queries(vectors, args.queries)
+    print(f"\nCorpus: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}\n")
+
+    # Exact search is the ground truth for recall
+    baseline = benchmark("flat", vectors, queries, args.k)
+    truth = baseline["ids"]
+
+    if args.shards:
+        print(f"{os.cpu_count()} CPUs\n")
+        print(f"{'index':<10} {'shards':>7} {'build s':>9} {'p50 ms':>9} {'p95 ms':>9} {'speedup':>8} {'recall@' + str(args.k):>10}")
+        for index_type in args.types:
+            single = None
+            for shards in args.shards:
+                result = benchmark(index_type, vectors, queries, args.k, truth, shards)
+                single = single or result["p50_ms"]
+                print(f"{index_type:<10} {shards:>7} {result['build_s']:>9.2f} {result['p50_ms']:>9.3f} "
+                      f"{result['p95_ms']:>9.3f} {single / result['p50_ms']:>7.2f}x {result['recall']:>10.3f}")
+        print()
+        return
+
+    print(f"{'index':<10} {'build s':>9} {'p50 ms':>9} {'p95 ms':>9} {'memory MB':>10} {'recall@' + str(args.k):>10}")
+    for index_type in args.types:
+        result = baseline if index_type == "flat" else benchmark(index_type, vectors, queries, args.k, truth)
+        print(f"{result['type']:<10} {result['build_s']:>9.2f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+              f"{result['memory_mb']:>10.1f} {result['recall']:>10.3f}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Load-test the chat API by replaying a query file at one or more concurrency levels.
+
+Reports client-side p50/p95/p99 latency, time to first token (with `--stream`), throughput, errors,
+answer-cache hits, the server's own per-stage p50s (from the returned `timings`) and the server's
+memory (scraped from `/metrics`).
+
+With no models installed, serve the fake Ollama API from this process and point the app at it:
+
+    python backend/app.py                     # or backend/asgi_app.py (OLLAMA_BASE_URL must match)
+    python backend/bench_load.py --fake-ollama --concurrency 1 4 16 --requests 200 --stream
+
+Query files are JSONL (`query`, `question` or `title` field per line, e.g. `requests.jsonl`) or
+plain text with one query per line.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+import config
+
+
+QUERY_FIELDS = ("query", "question", "title")
+SERVER_STAGES = ("embed", "search", "ttft")
+
+
+def read_queries(path: str) -> List[str]:
+    """Load queries from a JSONL file (first of `QUERY_FIELDS` per record) or a plain text file."""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = line
+            if isinstance(record, dict):
+                record = next((record[k] for k in QUERY_FIELDS if isinstance(record.get(k), str)), None)
+            if isinstance(record, str) and record.strip():
+                queries.append(record.strip())
+    if not queries:
+        raise SystemExit(f"No queries found in {path}")
+    return queries
+
+
+def _chat(session: requests.Session, base_url: str, payload: Dict) -> Dict:
+    start = time.perf_counter()
+    r = session.post(base_url + "/chat", json=payload, timeout=config.OLLAMA_TIMEOUT)
+    result = {"latency": time.perf_counter() - start, "status": r.status_code, "ttft": None}
+    if r.ok:
+        body = r.json()
+        result.update(ok=body.get("success", False), cached=body.get("cached", False), timings=body.get("timings", {}))
+    return result
+
+
+def _chat_stream(session: requests.Session, base_url: str, payload: Dict) -> Dict:
+    start = time.perf_counter()
+    result = {"ttft": None}
+    with session.post(base_url + "/chat/stream", json=payload, stream=True, timeout=config.OLLAMA_TIMEOUT) as r:
+        result["status"] = r.status_code
+        if r.ok:
+            for line in r.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                event = json.loads(line[6:])
+                if event["type"] == "token" and result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - start
+                elif event["type"] in ("done", "error"):
+                    result.update(ok=event["type"] == "done", cached=event.get("cached", False),
+                                  timings=event.get("timings", {}))
+    result["latency"] = time.perf_counter() - start
+    return result
+
+
+def run_level(base_url: str, queries: List[str], concurrency: int, num_requests: int,
+              stream: bool = False, options: Optional[Dict] = None) -> Dict:
+    """Send `num_requests` chats (cycling through `queries`) with `concurrency` in flight."""
+    local = threading.local()
+    send = _chat_stream if stream else _chat
+
+    def one(i: int) -> Dict:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        try:
+            return send(local.session, base_url, {"query": queries[i % len(queries)], **(options or {})})
+        except requests.RequestException as e:
+            return {"latency": None, "status": type(e).__name__, "ttft": None}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(num_requests)))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r.get("ok")]
+    summary = {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "errors": num_requests - len(ok),
+        "statuses": sorted({str(r["status"]) for r in results if r.get("status") != 200}),
+        "cache_hits": sum(1 for r in ok if r.get("cached")),
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "elapsed_s": elapsed,
+    }
+    latencies_ms = np.array([r["latency"] for r in ok]) * 1000
+    for p in (50, 95, 99):
+        summary[f"p{p}_ms"] = float(np.percentile(latencies_ms, p)) if len(ok) else None
+    ttfts_ms = np.array([r["ttft"] for r in ok if r["ttft"] is not None]) * 1000
+    for p in (50, 95):
+        summary[f"ttft_p{p}_ms"] = float(np.percentile(ttfts_ms, p)) if len(ttfts_ms) else None
+    for stage in SERVER_STAGES:
+        values = [r["timings"][stage] for r in ok if stage in r.get("timings", {})]
+        summary[f"server_{stage}_p50_ms"] = float(np.median(values)) if values else None
+    return summary
+
+
+def scrape_memory(base_url: str) -> Dict[str, float]:
+    """Server resident/peak memory in MB from `/metrics` (empty if unavailable)."""
+    names = {"medai_process_resident_memory_bytes": "rss_mb", "medai_process_peak_memory_bytes": "peak_rss_mb"}
+    try:
+        text = requests.get(base_url + "/metrics", timeout=5).text
+    except requests.RequestException:
+        return {}
+    memory = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in names:
+            memory[names[name]] = float(value) / 1e6
+    return memory
+
+
+def _fmt(value, width: int, digits: int = 1) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay queries against /chat at several concurrency levels.")
+    parser.add_argument("--url", default=f"http://{config.FLASK_HOST}:{config.FLASK_PORT}")
+    parser.add_argument("--queries", default=os.path.join(config.BASE_DIR, "requests.jsonl"))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests sent first")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream and measure time to first token")
+    parser.add_argument("--temperature", type=float)
+    parser.add_argument("--llm-model")
+    parser.add_argument("--k", type=int)
+    parser.add_argument("--fake-ollama", action="store_true", help="serve the fake Ollama API from this process")
+    parser.add_argument("--fake-port", type=int, default=11434)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0, help="fake Ollama delay between tokens")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH for regression tracking")
+    args = parser.parse_args()
+
+    if args.fake_ollama:
+        from fake_ollama import FakeOllama, make_server
+        server = make_server(FakeOllama(token_delay_ms=args.token_delay_ms), port=args.fake_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"🧪 Fake Ollama listening on port {args.fake_port}")
+
+    base_url = args.url.rstrip("/")
+    queries = read_queries(args.queries)
+    options = {key: value for key, value in
+               (("temperature", args.temperature), ("llm_model", args.llm_model), ("k", args.k))
+               if value is not None}
+    if args.warmup:
+        run_level(base_url, queries, 1, args.warmup, args.stream, options)
+
+    print(f"\n{len(queries)} queries, {args.requests} requests per level, "
+          f"{'/chat/stream' if args.stream else '/chat'} at {base_url}\n")
+    print(f"{'conc':>5} {'ok':>5} {'err':>4} {'cached':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'ttft50':>7} {'ttft95':>7} {'embed':>6} {'search':>6} {'s-ttft':>7} {'rss MB':>7}")
+    results = []
+    for concurrency in args.concurrency:
+        summary = run_level(base_url, queries, concurrency, args.requests, args.stream, options)
+        summary.update(scrape_memory(base_url))
+        results.append(summary)
+        print(f"{concurrency:>5} {args.requests - summary['errors']:>5} {summary['errors']:>4} {summary['cache_hits']:>6} "
+              f"{summary['throughput_rps']:>7.2f} {_fmt(summary['p50_ms'], 8)} {_fmt(summary['p95_ms'], 8)} "
+              f"{_fmt(summary['p99_ms'], 8)} {_fmt(summary['ttft_p50_ms'], 7)} {_fmt(summary['ttft_p95_ms'], 7)} "
+              f"{_fmt(summary['server_embed_p50_ms'], 6)} {_fmt(summary['server_search_p50_ms'], 6)} "
+              f"{_fmt(summary['server_ttft_p50_ms'], 7)} {_fmt(summary.get('rss_mb'), 7)}")
+        if summary["statuses"]:
+            print(f"      non-200 responses: {', '.join(summary['statuses'])}")
+    print()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": base_url, "stream": args.stream, "options": options, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
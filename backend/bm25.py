@@ -0,0 +1,131 @@
+"""BM25 lexical index persisted next to the FAISS index, plus rank fusion for hybrid retrieval.
+
+Postings are stored as flat arrays (memory-mapped at query time):
+- `bm25.vocab.json`        term -> term id, plus k1/b/document count
+- `bm25.offsets.npy`       int64, postings of term t are `[offsets[t], offsets[t+1])`
+- `bm25.doc_ids.npy`       int32 document (= FAISS vector) positions
+- `bm25.weights.npy`       float32 precomputed BM25 term-frequency component per posting
+
+Because the document-length normalisation is baked into `weights`, scoring a query is one
+idf-weighted scatter-add per query term.
+"""
+
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+
+VOCAB_FILE = "bm25.vocab.json"
+OFFSETS_FILE = "bm25.offsets.npy"
+DOC_IDS_FILE = "bm25.doc_ids.npy"
+WEIGHTS_FILE = "bm25.weights.npy"
+
+# Keep digits and inner hyphens so "5-fu", "hba1c" or "covid-19" stay one token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this to "
+    "was what when where which who why will with can do does my me".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def bm25_exists(index_dir: str) -> bool:
+    return all(os.path.exists(os.path.join(index_dir, name))
+               for name in (VOCAB_FILE, OFFSETS_FILE, DOC_IDS_FILE, WEIGHTS_FILE))
+
+
+def build_bm25(index_dir: str, texts: Iterable[str], k1: float = 1.5, b: float = 0.75) -> int:
+    """Build and save the BM25 index for `texts` (document i = FAISS vector i). Returns the vocab size."""
+    vocab: Dict[str, int] = {}
+    post_docs: List[array] = []
+    post_tfs: List[array] = []
+    doc_lens = array("i")
+
+    for doc_id, text in enumerate(texts):
+        tokens = tokenize(text)
+        doc_lens.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_id = vocab.setdefault(term, len(vocab))
+            if term_id == len(post_docs):
+                post_docs.append(array("i"))
+                post_tfs.append(array("i"))
+            post_docs[term_id].append(doc_id)
+            post_tfs[term_id].append(tf)
+
+    lens = np.frombuffer(doc_lens, dtype=np.int32).astype(np.float32) if len(doc_lens) else np.zeros(0, np.float32)
+    avgdl = float(lens.mean()) if len(lens) else 0.0
+    norm = k1 * (1 - b + b * lens / avgdl) if avgdl else np.full(len(lens), k1, dtype=np.float32)
+
+    offsets = np.zeros(len(post_docs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in post_docs])
+    doc_ids = np.empty(int(offsets[-1]), dtype=np.int32)
+    weights = np.empty(int(offsets[-1]), dtype=np.float32)
+    for term_id, (docs, tfs) in enumerate(zip(post_docs, post_tfs)):
+        lo, hi = offsets[term_id], offsets[term_id + 1]
+        ids = np.frombuffer(docs, dtype=np.int32)
+        tf = np.frombuffer(tfs, dtype=np.int32).astype(np.float32)
+        doc_ids[lo:hi] = ids
+        weights[lo:hi] = tf * (k1 + 1) / (tf + norm[ids])
+
+    for name, arr in ((OFFSETS_FILE, offsets), (DOC_IDS_FILE, doc_ids), (WEIGHTS_FILE, weights)):
+        path = os.path.join(index_dir, name)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, arr)
+        os.replace(path + ".tmp", path)
+    vocab_path = os.path.join(index_dir, VOCAB_FILE)
+    with open(vocab_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"k1": k1, "b": b, "num_docs": len(doc_lens), "terms": vocab}, f)
+    os.replace(vocab_path + ".tmp", vocab_path)
+    return len(vocab)
+
+
+class BM25Index:
+    """Read-only BM25 scorer over the memory-mapped postings arrays."""
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, VOCAB_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.terms: Dict[str, int] = meta["terms"]
+        self.num_docs = meta["num_docs"]
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_FILE), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(index_dir, DOC_IDS_FILE), mmap_mode="r")
+        self.weights = np.load(os.path.join(index_dir, WEIGHTS_FILE), mmap_mode="r")
+
+    def search(self, query: str, k: int) -> List[int]:
+        """Return up to `k` document positions ranked by BM25 score (documents matching no term are omitted)."""
+        term_ids = {self.terms[t] for t in tokenize(query) if t in self.terms}
+        if not term_ids:
+            return []
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term_id in term_ids:
+            lo, hi = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            df = hi - lo
+            idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            # A term lists each document once, so plain fancy-index addition is safe
+            scores[self.doc_ids[lo:hi]] += idf * self.weights[lo:hi]
+
+        matched = np.count_nonzero(scores)
+        k = min(k, matched)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])].tolist()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], weights: Sequence[float],
+                           rrf_k: int = 60) -> List[int]:
+    """Fuse ranked id lists: score(d) = sum_i weight_i / (rrf_k + rank_i(d)), highest first."""
+    scores: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
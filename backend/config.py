@@ -8,21 +8,46 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 PDF_PATH = os.path.join(DATA_DIR, "medical_docs.pdf")
 FAISS_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index")
 TEXTS_DIR = os.path.join(DATA_DIR, "texts")
+EMBED_CACHE_DIR = os.path.join(DATA_DIR, "embed_cache")  # persistent chunk and query embedding caches
+
+# Documents ingested by data_preparation.py: files and/or directory trees of .pdf/.txt/.md
+CORPUS_PATHS = [PDF_PATH, TEXTS_DIR]
 
 # Ensure directories exist
 for dir_path in [DATA_DIR, FAISS_INDEX_PATH, TEXTS_DIR]:
     os.makedirs(dir_path, exist_ok=True)
 
 # Ollama settings
-OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")  # env override, e.g. for fake_ollama.py
 EMBED_MODEL_NAME = "nomic-embed-text"  # Faster model for embeddings
 LLM_MODEL_NAME = "gemma3:1b"    # Model to use for generation
 
 # Selected LLM models (UI selection); first is treated as primary
 SELECTED_LLM_MODELS = [LLM_MODEL_NAME]
 
+# Latency-aware routing over SELECTED_LLM_MODELS plus the active model (model_router.py).
+# Requests naming an llm_model always use that model.
+ROUTER_ENABLED = True
+ROUTER_POLICY = "fastest"          # "fastest": the active model while healthy, else the fastest other one; "length": see below
+ROUTER_SHORT_QUERY_CHARS = 200     # "length" policy: shorter questions go to the fastest healthy model, longer ones as "fastest"
+ROUTER_WINDOW = 50                 # recent generations per model behind its latency and error rate
+ROUTER_MAX_ERROR_RATE = 0.5        # models failing more often than this are only used as fallbacks
+ROUTER_FIRST_TOKEN_TIMEOUT = 20.0  # seconds to wait for a model's first token before falling back to the next one
+ROUTER_FAILURE_THRESHOLD = 3       # consecutive failures that open a model's circuit
+ROUTER_OPEN_SECONDS = 30           # an open circuit skips the model this long, then lets a request probe it
+
+# Model warm-up: load models into Ollama before the first chat and keep them resident
+OLLAMA_KEEP_ALIVE = "1h"        # sent with every request; -1 keeps models loaded until Ollama stops
+WARMUP_ON_STARTUP = True        # warm the embedding model and the active LLM when the retriever starts
+PRELOAD_SELECTED_MODELS = True  # also warm every model in SELECTED_LLM_MODELS (needs the RAM for all of them)
+WARMUP_REFRESH_SECONDS = 300    # re-issue the load calls this often (reloads after an Ollama restart); 0 = once
+WARMUP_TIMEOUT = 300            # seconds the servers wait for the startup warm-up before accepting chats
+
 # Path to FAISS metadata (stores which embedding model was used to build the index)
 FAISS_META_FILE = os.path.join(FAISS_INDEX_PATH, "meta.json")
+# Poll meta.json this often and hot-reload a rebuilt index (0 = only via POST /admin/reload-index)
+INDEX_WATCH_SECONDS = 5
+INDEX_RELOAD_WARMUP_QUERIES = 8   # searches run on a new index version before it is swapped in
 
 # Will be populated at startup with available models from Ollama
 MODEL_LIST = []
@@ -31,7 +56,94 @@ MODEL_LIST = []
 CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 300
 
+# Drop chunks that nearly duplicate an earlier one before embedding them (see near_dedup.py)
+NEAR_DEDUP_ENABLED = True
+NEAR_DEDUP_THRESHOLD = 0.85   # estimated Jaccard similarity of word 5-gram sets
+NEAR_DEDUP_NUM_PERM = 128     # MinHash signature length
+NEAR_DEDUP_BANDS = 16         # LSH bands; more bands find candidates at lower similarity
+NEAR_DEDUP_SHINGLE_WORDS = 5
+
+# Index build settings
+EMBED_BATCH_SIZE = 32  # chunks per Ollama /api/embed call
+EMBED_WORKERS = 4      # embedding batches in flight at once
+EMBED_CACHE_CHUNK_CAPACITY = 2_000_000  # chunk embeddings kept for rebuilds (LRU beyond this)
+INGEST_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # processes parsing PDFs in parallel
+INGEST_TEXT_BLOCK_CHARS = 100_000  # .txt/.md files are read and chunked this many characters at a time
+
+# FAISS index type: "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw" (approximate); see vector_index.py.
+# Only the IVF types are memory-mapped when served; flat and HNSW are loaded into each worker's RAM
+FAISS_INDEX_TYPE = "flat"
+FAISS_TRAIN_SIZE = 20000      # chunks sampled to train IVF indexes
+FAISS_NLIST = None            # IVF lists; None = ~4*sqrt(N)
+FAISS_NPROBE = 16             # IVF lists searched per query (recall vs latency)
+FAISS_PQ_M = 48               # IVF-PQ bytes per vector; must divide the embedding dimension
+FAISS_HNSW_M = 32             # HNSW links per node
+FAISS_EF_CONSTRUCTION = 200   # HNSW build-time candidate list
+FAISS_EF_SEARCH = 64          # HNSW query-time candidate list (recall vs latency)
+FAISS_SHARDS = 1              # split the vectors over this many index files, searched in parallel
+
+# Retrieval settings
+RETRIEVAL_K = 3      # chunks stuffed into the prompt by default
+MAX_RETRIEVAL_K = 10  # upper bound for a per-request "k"
+
+# Relevance cutoff + maximal-marginal-relevance diversification of the retrieved chunks (mmr.py)
+MMR_ENABLED = True
+MMR_FETCH_MULTIPLIER = 4         # candidates considered per chunk returned
+MMR_LAMBDA = 0.7                 # 1.0 = rank by relevance only; lower values favour diverse chunks
+RETRIEVAL_MIN_SIMILARITY = 0.4   # cosine similarity to the query; weaker chunks are dropped (None = keep all)
+
+# Prompt assembly (prompt_builder.py): retrieved chunks are deduplicated and trimmed to this budget
+PROMPT_CONTEXT_TOKENS = 1024   # context tokens per prompt (prompt size drives prefill latency)
+PROMPT_CHARS_PER_TOKEN = 4.0   # rough estimate used for the budget
+
+# Hybrid retrieval: BM25 (built next to the FAISS index) fused with vector search by reciprocal rank fusion
+HYBRID_ENABLED = True
+HYBRID_DENSE_WEIGHT = 1.0
+HYBRID_BM25_WEIGHT = 1.0
+HYBRID_RRF_K = 60
+HYBRID_CANDIDATE_MULTIPLIER = 4  # each retriever contributes k * this candidates to the fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Micro-batching of concurrent query embeddings and FAISS searches
+QUERY_BATCHING_ENABLED = True
+QUERY_BATCH_MAX_SIZE = 32
+QUERY_BATCH_MAX_WAIT_MS = 5  # how long the first query in a batch waits for company
+
+# Identical concurrent questions (same normalized text, model and temperature) share one generation
+COALESCE_REQUESTS = True
+
+# /chat/batch (bulk question runs)
+BATCH_MAX_ITEMS = 10000       # questions per batch
+BATCH_MAX_PARALLEL = 4        # generations running at once per batch (also the upper bound for "max_parallel")
+
+# Conversation memory (requests carrying a session_id); see conversation.py
+CONVERSATION_ENABLED = True
+CONVERSATION_MAX_SESSIONS = 1000      # least recently used sessions are dropped beyond this
+CONVERSATION_TTL_SECONDS = 3600       # sessions idle this long start over
+CONVERSATION_RECENT_TURNS = 3         # turns kept verbatim; older ones are folded into a summary
+CONVERSATION_TURN_CHARS = 600         # answers are shortened to this in the history
+CONVERSATION_CONDENSE_TOKENS = 64     # max tokens for the standalone rewrite of a follow-up
+CONVERSATION_SUMMARY_TOKENS = 160     # max tokens for the running summary
+
+# Persistent query-embedding cache keyed by normalized query text (survives restarts)
+QUERY_EMBED_CACHE_ENABLED = True
+QUERY_EMBED_CACHE_CAPACITY = 200_000  # queries kept (LRU beyond this); ~3 KB each at 768 dims
+
+# Answer cache (exact + embedding-similarity lookup in front of retrieval/generation)
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_MAX_ENTRIES = 512
+ANSWER_CACHE_TTL_SECONDS = 3600
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92  # cosine similarity between query embeddings
+
 # API settings
 FLASK_HOST = "127.0.0.1"
 FLASK_PORT = 5000
-DEFAULT_TEMPERATURE = 0.7
\ No newline at end of file
+DEFAULT_TEMPERATURE = 0.7
+
+# Async (ASGI) serving mode, see asgi_app.py
+ASYNC_MAX_CONCURRENCY = 8     # chats generating at once
+ASYNC_MAX_QUEUE = 256         # chats allowed to wait for a slot before 429
+ASYNC_QUEUE_TIMEOUT = 30.0    # seconds a chat may wait for a slot before 503
+OLLAMA_MAX_CONNECTIONS = 32   # pooled keep-alive connections to Ollama
+OLLAMA_TIMEOUT = 120.0        # seconds
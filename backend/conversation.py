@@ -0,0 +1,146 @@
+"""Session-scoped conversation memory with incremental summarization.
+
+Each session keeps a running summary plus its last few turns verbatim. Once a session has more
+than `recent_turns` turns, the oldest ones are folded into the summary by a background worker (one
+LLM call per fold, off the request path), so the history sent with each prompt stays roughly
+constant in size however long the conversation gets. Turns stay in the history until their fold
+has finished, so nothing drops out of the prompt while the summary is being written.
+
+Sessions live in memory, bounded by `max_sessions` (least recently used evicted first) and
+expiring after `ttl_seconds` of inactivity.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+
+Turn = Tuple[str, str]  # (user question, assistant answer)
+
+CONDENSE_PROMPT = """Rewrite the follow-up question so it can be understood without the conversation, keeping its meaning. Reply with the rewritten question only.
+
+{history}
+
+Follow-up question: {question}
+Standalone question:"""
+
+SUMMARY_PROMPT = """Update the summary of a conversation between a user and a medical assistant with the new exchanges. Keep the user's symptoms, conditions, medications and the key advice given. Reply with the new summary only, at most 5 sentences.
+
+Current summary:
+{summary}
+
+New exchanges:
+{turns}
+
+New summary:"""
+
+
+def format_turns(turns: List[Turn]) -> str:
+    return "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+
+def clean_standalone_question(text: str, fallback: str) -> str:
+    """First line of the model's rewrite, or `fallback` when the rewrite is empty or runs on."""
+    lines = [line.strip() for line in (text or "").strip().splitlines() if line.strip()]
+    question = lines[0].strip(" \"'") if lines else ""
+    if not question or len(question) > 4 * len(fallback) + 200:
+        return fallback
+    return question
+
+
+class Conversation:
+    """History of one session; use `history()` to render it for a prompt."""
+
+    def __init__(self):
+        self.summary = ""
+        self.turns: List[Turn] = []
+        self.folding = 0  # oldest turns currently being folded into the summary
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def has_history(self) -> bool:
+        return bool(self.summary or self.turns)
+
+    def history(self) -> str:
+        with self.lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Summary of the earlier conversation: {self.summary}")
+            if self.turns:
+                parts.append(format_turns(self.turns))
+            return "\n".join(parts)
+
+
+class ConversationStore:
+    """Bounded, expiring `session_id -> Conversation` map.
+
+    `summarize(summary, turns) -> new summary` is called on a background thread to fold old turns.
+    """
+
+    def __init__(self, summarize: Callable[[str, List[Turn]], str], max_sessions: int = 1000,
+                 ttl_seconds: float = 3600, recent_turns: int = 3, turn_chars: int = 600):
+        self.summarize = summarize
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.recent_turns = recent_turns
+        self.turn_chars = turn_chars
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self.evicted = 0
+        self.folds = 0
+
+    def get(self, session_id: str) -> Conversation:
+        """The session's conversation, created if it is new or has expired."""
+        now = time.monotonic()
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is None or now - conversation.last_used > self.ttl_seconds:
+                conversation = self._sessions[session_id] = Conversation()
+            conversation.last_used = now
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        return conversation
+
+    def record(self, conversation: Conversation, question: str, answer: str) -> None:
+        """Append a turn and start folding old turns into the summary when there are too many."""
+        if len(answer) > self.turn_chars:
+            answer = answer[:self.turn_chars].rsplit(" ", 1)[0] + " …"
+        with conversation.lock:
+            conversation.turns.append((question, answer))
+            if conversation.folding:
+                return
+            # If summarization keeps failing, still bound the history
+            del conversation.turns[:max(0, len(conversation.turns) - 4 * self.recent_turns)]
+            if len(conversation.turns) > self.recent_turns:
+                conversation.folding = len(conversation.turns) - self.recent_turns
+                self._summarizer.submit(self._fold, conversation)
+
+    def _fold(self, conversation: Conversation) -> None:
+        with conversation.lock:
+            summary, turns = conversation.summary, conversation.turns[:conversation.folding]
+        try:
+            new_summary: Optional[str] = self.summarize(summary, turns).strip()
+        except Exception as e:
+            print(f"⚠️ Could not summarize conversation: {e}")
+            new_summary = None
+        with conversation.lock:
+            if new_summary:
+                conversation.summary = new_summary
+                # Turns appended meanwhile sit after the folded ones, so the prefix is unchanged
+                del conversation.turns[:len(turns)]
+                self.folds += 1
+            conversation.folding = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evicted": self.evicted,
+                "summaries": self.folds
+            }
@@ -1,94 +1,453 @@
 import sys
-from typing import List
+import argparse
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator, List
 from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_ollama import OllamaEmbeddings
 from langchain_community.vectorstores import FAISS
+import faiss
+import numpy as np
 
+from bm25 import build_bm25
+from docstore import DocstoreWriter, MmapDocstore
+from embedding_cache import EmbeddingCache
+from near_dedup import NearDuplicateFilter
 import config
+import ollama_client
+import vector_index
 import os
 import json
 import datetime
 
 
 
-def load_and_split_pdf() -> List:
-    """Load PDF and split into chunks."""
-    print(f"Loading PDF from: {config.PDF_PATH}")
-    
+SOURCE_EXTENSIONS = (".pdf", ".txt", ".md")
+
+
+def iter_source_files(paths: Iterable[str]) -> Iterator[str]:
+    """Yield every ingestible file under `paths` (files or directory trees), in sorted order."""
+    for path in paths:
+        if os.path.isfile(path):
+            if path.lower().endswith(SOURCE_EXTENSIONS):
+                yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(SOURCE_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+def _is_pdf(path: str) -> bool:
+    return path.lower().endswith(".pdf")
+
+
+def _load_pages(path: str) -> List[Document]:
+    """Parse one PDF into page documents (runs in a worker process)."""
+    return list(PyMuPDFLoader(path).lazy_load())
+
+
+def _iter_text_pages(path: str) -> Iterator[Document]:
+    """Read a text file in blocks of about `config.INGEST_TEXT_BLOCK_CHARS` characters.
+
+    Each block is extended to the end of its line (by at most one more block), so a chunk is only
+    cut at a block boundary where a line ends. The block number is used as the page number.
+    """
+    size = config.INGEST_TEXT_BLOCK_CHARS
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        page = 0
+        while True:
+            text = f.read(size)
+            if not text:
+                break
+            if not text.endswith("\n"):
+                text += f.readline(size)
+            yield Document(page_content=text, metadata={"source": path, "page": page})
+            page += 1
+
+
+def iter_pages(files: Iterable[str]) -> Iterator[Document]:
+    """Parse files and yield their pages in file order.
+
+    PDFs are parsed in worker processes; at most `2 * config.INGEST_WORKERS` files are parsed or
+    waiting at once, so memory stays bounded no matter how many files the corpus has. Text files
+    are streamed block by block (`_iter_text_pages`) when their turn comes, however large they are.
+    """
+    files = iter(files)
+    window = 2 * config.INGEST_WORKERS
+    with ProcessPoolExecutor(max_workers=config.INGEST_WORKERS) as pool:
+        def submit(path):
+            return path, pool.submit(_load_pages, path) if _is_pdf(path) else None
+
+        pending = deque()
+        for path in files:
+            pending.append(submit(path))
+            if len(pending) >= window:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(files, None)
+            if next_path is not None:
+                pending.append(submit(next_path))
+            pages = 0
+            try:
+                if future is None:
+                    for page in _iter_text_pages(path):
+                        pages += 1
+                        yield page
+                else:
+                    documents = future.result()
+                    pages = len(documents)
+                    yield from documents
+            except Exception as e:
+                # One unreadable file should not abort a corpus-wide build
+                print(f"Warning: skipping {'the rest of ' if pages else ''}{path}: {e}")
+                continue
+            print(f"Loaded {path} ({pages} pages)")
+
+
+def iter_chunks(pages: Iterable[Document]) -> Iterator[Document]:
+    """Split pages into chunks one page at a time, tagging each chunk with its content hash."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=config.CHUNK_SIZE,
+        chunk_overlap=config.CHUNK_OVERLAP,
+        length_function=len,
+    )
+    for page in pages:
+        for chunk in text_splitter.split_documents([page]):
+            chunk.metadata["chunk_hash"] = chunk_hash(chunk.page_content)
+            yield chunk
+
+
+def near_duplicate_filter() -> NearDuplicateFilter:
+    """The configured near-duplicate filter, or None when it is disabled."""
+    if not config.NEAR_DEDUP_ENABLED:
+        return None
+    return NearDuplicateFilter(
+        threshold=config.NEAR_DEDUP_THRESHOLD,
+        num_perm=config.NEAR_DEDUP_NUM_PERM,
+        bands=config.NEAR_DEDUP_BANDS,
+        shingle_words=config.NEAR_DEDUP_SHINGLE_WORDS
+    )
+
+
+def iter_batches(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash identifying a chunk independently of where it came from."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def open_chunk_cache() -> EmbeddingCache:
+    """The persistent chunk-embedding cache for the configured model (also the build checkpoint)."""
+    return EmbeddingCache(config.EMBED_MODEL_NAME, "chunks", config.EMBED_CACHE_CHUNK_CAPACITY)
+
+
+def embed_chunks(documents: List, cache: EmbeddingCache) -> List[np.ndarray]:
+    """Return one vector per document, embedding only chunks missing from the cache.
+
+    Missing chunks are embedded in batches of `config.EMBED_BATCH_SIZE`, with up to
+    `config.EMBED_WORKERS` batches in flight against Ollama at once.
+    """
+    hashes = [doc.metadata.get("chunk_hash") or chunk_hash(doc.page_content) for doc in documents]
+    vectors = cache.get_many(set(hashes))
+
+    # Unique texts still to embed (duplicate chunks are embedded once)
+    missing = {}
+    for h, doc in zip(hashes, documents):
+        if h not in vectors and h not in missing:
+            missing[h] = doc.page_content
+
+    items = list(missing.items())
+    batches = [items[i:i + config.EMBED_BATCH_SIZE] for i in range(0, len(items), config.EMBED_BATCH_SIZE)]
+    if batches:
+        with ThreadPoolExecutor(max_workers=config.EMBED_WORKERS) as pool:
+            futures = {
+                pool.submit(ollama_client.embed, config.OLLAMA_BASE_URL, config.EMBED_MODEL_NAME,
+                            [text for _, text in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                results = [(h, v) for (h, _), v in zip(batch, future.result())]
+                cache.put_many(results)
+                vectors.update((h, np.asarray(v, dtype=np.float32)) for h, v in results)
+
+    return [vectors[h] for h in hashes]
+
+
+def _new_index(train_vectors: np.ndarray) -> faiss.Index:
+    """Create an empty index of the type selected in config."""
+    params = vector_index.index_params(num_train=len(train_vectors))
+    shards = f" x {config.FAISS_SHARDS} shards" if config.FAISS_SHARDS > 1 else ""
+    print(f"Creating {params['type']} index{shards} ({json.dumps(params)})")
+    index = vector_index.build_index(train_vectors.shape[1], params, train_vectors)
+    return vector_index.make_sharded(index, config.FAISS_SHARDS)
+
+
+def _add_to_index(index: faiss.Index, writer: DocstoreWriter, docs: List[Document],
+                  vectors: List[np.ndarray]) -> None:
+    # Vector i and docstore record i must stay aligned
+    index.add(np.vstack(vectors).astype(np.float32))
+    writer.add(docs)
+
+
+def index_chunks(chunks: Iterable[Document], cache: EmbeddingCache, writer: DocstoreWriter,
+                 index: faiss.Index = None, skip_hashes: set = None) -> faiss.Index:
+    """Stream chunks into a FAISS index and docstore, embedding them window by window.
+
+    Only one window (`EMBED_BATCH_SIZE * EMBED_WORKERS` chunks) is held in memory besides the
+    index itself; IVF index types additionally buffer up to `FAISS_TRAIN_SIZE` chunks to train on.
+    Chunks whose hash is in `skip_hashes` are dropped (and the set is updated as chunks are added).
+    Returns the index, or None if no chunk was added to a new one.
+    """
+    skip_hashes = skip_hashes if skip_hashes is not None else set()
+    window = config.EMBED_BATCH_SIZE * config.EMBED_WORKERS
+    train_size = config.FAISS_TRAIN_SIZE if vector_index.needs_training(config.FAISS_INDEX_TYPE) else 0
+    pending_docs, pending_vectors = [], []
+    start = time.perf_counter()
+    indexed = skipped = 0
+
+    for batch in iter_batches(chunks, window):
+        docs = []
+        for doc in batch:
+            if doc.metadata["chunk_hash"] in skip_hashes:
+                skipped += 1
+                continue
+            skip_hashes.add(doc.metadata["chunk_hash"])
+            docs.append(doc)
+        if not docs:
+            continue
+
+        vectors = embed_chunks(docs, cache)
+        if index is None:
+            # Hold chunks back until there is enough data to train the index
+            pending_docs.extend(docs)
+            pending_vectors.extend(vectors)
+            if len(pending_docs) < train_size:
+                print(f"Collected {len(pending_docs)}/{train_size} training chunks")
+                continue
+            index = _new_index(np.vstack(pending_vectors))
+            docs, vectors = pending_docs, pending_vectors
+            pending_docs, pending_vectors = [], []
+        _add_to_index(index, writer, docs, vectors)
+
+        indexed += len(docs)
+        elapsed = time.perf_counter() - start
+        print(f"Indexed {indexed} chunks ({skipped} duplicates skipped, {indexed/elapsed:.1f} chunks/s)")
+
+    if pending_docs:
+        # Corpus smaller than the training sample: train on everything
+        index = _new_index(np.vstack(pending_vectors))
+        _add_to_index(index, writer, pending_docs, pending_vectors)
+        indexed += len(pending_docs)
+
+    elapsed = time.perf_counter() - start
+    if indexed:
+        print(f"Indexing finished in {elapsed:.1f}s ({indexed/elapsed:.1f} chunks/s)")
+    return index
+
+
+def _write_meta(index: faiss.Index, dedup: NearDuplicateFilter = None) -> None:
+    """Save metadata about the embedding model and index type used to build this index."""
+    try:
+        meta = {
+            "embed_model": config.EMBED_MODEL_NAME,
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "num_chunks": index.ntotal,
+            "shards": vector_index.num_shards(index),
+            "index": vector_index.describe_params(index)
+        }
+        if dedup is not None:
+            meta["dedup"] = dedup.stats()
+        os.makedirs(config.FAISS_INDEX_PATH, exist_ok=True)
+        # Written last and renamed into place: a running server reloads the index when it appears
+        with open(config.FAISS_META_FILE + ".tmp", "w", encoding="utf-8") as mf:
+            json.dump(meta, mf)
+        os.replace(config.FAISS_META_FILE + ".tmp", config.FAISS_META_FILE)
+        print(f"FAISS meta saved to: {config.FAISS_META_FILE}")
+    except Exception as e:
+        print(f"Warning: could not write FAISS meta file: {e}")
+
+
+def _build_lexical_index() -> None:
+    """(Re)build the BM25 postings from the docstore that was just written."""
+    start = time.perf_counter()
+    store = MmapDocstore(config.FAISS_INDEX_PATH)
+    try:
+        vocab_size = build_bm25(config.FAISS_INDEX_PATH, (doc.page_content for doc in store),
+                                k1=config.BM25_K1, b=config.BM25_B)
+    finally:
+        store.close()
+    print(f"BM25 index built: {vocab_size} terms over {len(store)} chunks in {time.perf_counter() - start:.1f}s")
+
+
+def _check_meta() -> dict:
+    """Return the index metadata; exit unless the index on disk was built with the configured embedding model."""
     try:
-        # Load PDF
-        loader = PyMuPDFLoader(config.PDF_PATH)
-        pages = loader.load()
-        
-        # Split text
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHUNK_SIZE,
-            chunk_overlap=config.CHUNK_OVERLAP,
-            length_function=len,
-        )
-        
-        splits = text_splitter.split_documents(pages)
-        print(f"Split PDF into {len(splits)} chunks")
-        return splits
-        
+        with open(config.FAISS_META_FILE, "r", encoding="utf-8") as mf:
+            meta = json.load(mf)
     except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
+        print(f"Error: no readable index metadata at {config.FAISS_META_FILE} ({e})")
         sys.exit(1)
+    if meta.get("embed_model") != config.EMBED_MODEL_NAME:
+        print(f"Error: index was built with '{meta.get('embed_model')}', config uses '{config.EMBED_MODEL_NAME}'. Rebuild instead.")
+        sys.exit(1)
+    return meta
 
-def create_vectorstore(documents: List) -> None:
-    """Create and save FAISS vectorstore using Ollama embeddings."""
-    print("Initializing Ollama embeddings...")
-    embeddings = OllamaEmbeddings(
-        base_url=config.OLLAMA_BASE_URL,
-        model=config.EMBED_MODEL_NAME
-    )
-    
-    print(f"Creating FAISS vectorstore for {len(documents)} chunks...")
+
+def create_vectorstore(paths: List[str]) -> None:
+    """Build and save a FAISS index + docstore from every document under `paths`."""
+    print(f"Creating FAISS vectorstore from: {', '.join(paths)}")
+    cache = open_chunk_cache()
+    writer = DocstoreWriter(config.FAISS_INDEX_PATH)
+    dedup = near_duplicate_filter()
     try:
-        # Create embeddings with progress tracking
-        total_chunks = len(documents)
-        for i, _ in enumerate(documents, 1):
-            if i % 10 == 0:  # Show progress every 10 chunks
-                print(f"Processing chunk {i}/{total_chunks} ({(i/total_chunks)*100:.1f}%)")
-        
-        vectorstore = FAISS.from_documents(documents, embeddings)
-        vectorstore.save_local(config.FAISS_INDEX_PATH)
+        chunks = iter_chunks(iter_pages(iter_source_files(paths)))
+        index = index_chunks(dedup.filter(chunks) if dedup else chunks, cache, writer)
+        if index is None:
+            print("Error: no text found in the corpus")
+            sys.exit(1)
+        if dedup:
+            print(dedup.report(index.d))
+        vector_index.write_index(index, config.FAISS_INDEX_PATH)
+        writer.close()
         print(f"Vectorstore saved to: {config.FAISS_INDEX_PATH}")
+        _build_lexical_index()
+        _write_meta(index, dedup)
 
-        # Save metadata about embedding model used to build this index
-        try:
-            meta = {
-                "embed_model": config.EMBED_MODEL_NAME,
-                "created_at": datetime.datetime.utcnow().isoformat() + "Z"
-            }
-            os.makedirs(config.FAISS_INDEX_PATH, exist_ok=True)
-            meta_path = os.path.join(config.FAISS_INDEX_PATH, "meta.json")
-            with open(meta_path, "w", encoding="utf-8") as mf:
-                json.dump(meta, mf)
-            print(f"FAISS meta saved to: {meta_path}")
-        except Exception as e:
-            print(f"Warning: could not write FAISS meta file: {e}")
-        
     except Exception as e:
         print(f"Error creating vectorstore: {str(e)}")
+        print("Embeddings finished so far are cached; re-run to resume.")
         sys.exit(1)
+    finally:
+        cache.close()
+
+
+def append_to_vectorstore(paths: List[str]) -> None:
+    """Add the documents under `paths` to the existing FAISS index without rebuilding it.
+
+    Chunks whose content hash is already in the index are skipped.
+    """
+    meta = _check_meta()
+
+    # Loaded into RAM (not memory-mapped) since we are going to add to it; new chunks continue the
+    # shard round-robin of the existing index, whatever FAISS_SHARDS says now
+    index = vector_index.read_index(config.FAISS_INDEX_PATH, mmap=False, shards=meta.get("shards", 1))
+    existing_store = MmapDocstore(config.FAISS_INDEX_PATH)
+    dedup = near_duplicate_filter()
+    existing = set()
+    for doc in existing_store:
+        existing.add(doc.metadata.get("chunk_hash") or chunk_hash(doc.page_content))
+        if dedup:
+            # New chunks are also checked against what is already indexed
+            dedup.add(doc.page_content)
+    existing_store.close()
+    before = index.ntotal
+
+    cache = open_chunk_cache()
+    writer = DocstoreWriter(config.FAISS_INDEX_PATH, append=True)
+    try:
+        chunks = iter_chunks(iter_pages(iter_source_files(paths)))
+        index_chunks(dedup.filter(chunks) if dedup else chunks, cache, writer,
+                     index=index, skip_hashes=existing)
+        if dedup:
+            print(dedup.report(index.d))
+        added = index.ntotal - before
+        if not added:
+            print("No new chunks to add")
+            return
+        vector_index.write_index(index, config.FAISS_INDEX_PATH)
+        writer.close()
+        print(f"Vectorstore updated at: {config.FAISS_INDEX_PATH} (+{added} chunks)")
+        _build_lexical_index()
+        _write_meta(index, dedup)
+    except Exception as e:
+        print(f"Error appending to vectorstore: {str(e)}")
+        print("Embeddings finished so far are cached; re-run to resume.")
+        sys.exit(1)
+    finally:
+        cache.close()
+
+
+def _embeddings_client() -> OllamaEmbeddings:
+    # Required by FAISS.load_local; nothing is embedded during conversion
+    return OllamaEmbeddings(
+        base_url=config.OLLAMA_BASE_URL,
+        model=config.EMBED_MODEL_NAME
+    )
+
+
+def convert_legacy_index() -> None:
+    """One-time migration of a LangChain `index.pkl` docstore to the pickle-free format.
+
+    This is the only place that still unpickles; only run it on an index you built yourself.
+    """
+    print(f"Converting legacy index in: {config.FAISS_INDEX_PATH}")
+    vectorstore = FAISS.load_local(
+        config.FAISS_INDEX_PATH,
+        _embeddings_client(),
+        allow_dangerous_deserialization=True
+    )
+    writer = DocstoreWriter(config.FAISS_INDEX_PATH)
+    for i in range(vectorstore.index.ntotal):
+        writer.add([vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])])
+    vector_index.write_index(vectorstore.index, config.FAISS_INDEX_PATH)
+    writer.close()
+    _build_lexical_index()
+    _write_meta(vectorstore.index)
+    print(f"Converted {len(writer)} chunks; {vector_index.LEGACY_DOCSTORE_FILE} is no longer used and can be deleted")
+
 
 def main():
-    """Main function to process PDF and create vectorstore."""
+    """Main function to ingest the corpus and create vectorstore."""
+    parser = argparse.ArgumentParser(description="Build or extend the FAISS index.")
+    parser.add_argument("paths", nargs="*",
+                        help="PDF/text files or directories to ingest (default: config.CORPUS_PATHS)")
+    parser.add_argument("--append", action="store_true",
+                        help="add the documents to the existing index instead of rebuilding it")
+    parser.add_argument("--convert-legacy", action="store_true",
+                        help="convert an existing index.pkl docstore to the pickle-free format and exit")
+    args = parser.parse_args()
+
     print("\n=== Starting Data Preparation ===\n")
-    
-    # Check if PDF exists
-    if not os.path.exists(config.PDF_PATH):
-        print(f"Error: PDF file not found at {config.PDF_PATH}")
+
+    if args.convert_legacy:
+        convert_legacy_index()
+        print("\n=== Data Preparation Complete ===\n")
+        return
+
+    paths = args.paths or config.CORPUS_PATHS
+    missing = [p for p in paths if not os.path.exists(p)]
+    if args.paths and missing:
+        print(f"Error: not found: {', '.join(missing)}")
+        sys.exit(1)
+    paths = [p for p in paths if os.path.exists(p)]
+    if not any(True for _ in iter_source_files(paths)):
+        print(f"Error: no PDF or text files found in {', '.join(paths) or 'the corpus paths'}")
         sys.exit(1)
-    
-    # Process documents
-    documents = load_and_split_pdf()
-    create_vectorstore(documents)
-    
+
+    if args.append:
+        append_to_vectorstore(paths)
+    else:
+        create_vectorstore(paths)
+
     print("\n=== Data Preparation Complete ===\n")
 
 if __name__ == "__main__":
     import os
-    main()
\ No newline at end of file
+    main()
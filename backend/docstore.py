@@ -0,0 +1,148 @@
+"""Compact, pickle-free chunk store that sits next to `index.faiss`.
+
+Layout inside the index directory:
+- `docstore.bin`          UTF-8 JSON records `{"text": ..., "metadata": ...}`, back to back
+- `docstore.offsets.npy`  int64 array of N+1 byte offsets; record i is `bin[offsets[i]:offsets[i+1]]`
+
+Record i belongs to FAISS vector i. Readers memory-map both files, so opening is instant and
+several worker processes share the same page cache.
+"""
+
+import json
+import mmap
+import os
+from typing import Iterator, List, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+
+BLOB_FILE = "docstore.bin"
+OFFSETS_FILE = "docstore.offsets.npy"
+
+
+def docstore_exists(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(index_dir, BLOB_FILE)) and os.path.exists(os.path.join(index_dir, OFFSETS_FILE))
+
+
+def _encode(doc: Document) -> bytes:
+    return json.dumps({"text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False).encode("utf-8")
+
+
+def _save_offsets(index_dir: str, offsets: List[int]) -> None:
+    # Written aside then renamed, so readers only ever see a complete offsets table
+    tmp_path = os.path.join(index_dir, OFFSETS_FILE + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    os.replace(tmp_path, os.path.join(index_dir, OFFSETS_FILE))
+
+
+class DocstoreWriter:
+    """Stream documents into a docstore; call `close()` to publish them.
+
+    A new store is written under temporary names and swapped in on close, so a process that has the
+    old store mapped is unaffected. With `append=True` records are appended to the existing blob in
+    place (readers never look past the old offsets) and only the offsets table is replaced.
+    """
+
+    def __init__(self, index_dir: str, append: bool = False):
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_dir = index_dir
+        self.append = append
+        blob_path = os.path.join(index_dir, BLOB_FILE)
+        if append:
+            self.offsets = np.load(os.path.join(index_dir, OFFSETS_FILE)).tolist()
+            self._blob = open(blob_path, "r+b")
+            # Drop bytes left behind by an interrupted append
+            self._blob.truncate(self.offsets[-1])
+            self._blob.seek(self.offsets[-1])
+        else:
+            self.offsets = [0]
+            self._blob = open(blob_path + ".tmp", "wb")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def add(self, documents: List[Document]) -> None:
+        for doc in documents:
+            record = _encode(doc)
+            self._blob.write(record)
+            self.offsets.append(self.offsets[-1] + len(record))
+
+    def close(self) -> None:
+        self._blob.flush()
+        os.fsync(self._blob.fileno())
+        self._blob.close()
+        if not self.append:
+            os.replace(os.path.join(self.index_dir, BLOB_FILE + ".tmp"), os.path.join(self.index_dir, BLOB_FILE))
+        _save_offsets(self.index_dir, self.offsets)
+
+
+class MmapDocstore(Docstore):
+    """Read-only LangChain docstore over the memory-mapped files; ids are the FAISS positions as str."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._offsets = np.load(os.path.join(index_dir, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(index_dir, BLOB_FILE), "rb") as f:
+            # mmap keeps its own reference to the file; an empty blob cannot be mapped
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def get(self, i: int) -> Document:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        record = json.loads(self._blob[start:end])
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            i = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if not 0 <= i < len(self):
+            return f"ID {search} not found."
+        return self.get(i)
+
+    def __iter__(self) -> Iterator[Document]:
+        for i in range(len(self)):
+            yield self.get(i)
+
+    def close(self) -> None:
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+
+
+class PositionalIds:
+    """`index_to_docstore_id` for `MmapDocstore`: vector i maps to docstore id `str(i)`.
+
+    Stands in for LangChain's dict without materializing one entry per chunk.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < self.size:
+            raise KeyError(i)
+        return str(i)
+
+    def get(self, i: int, default=None):
+        return str(i) if 0 <= i < self.size else default
+
+    def __contains__(self, i) -> bool:
+        return isinstance(i, (int, np.integer)) and 0 <= i < self.size
+
+    def keys(self):
+        return range(self.size)
+
+    def values(self):
+        return (str(i) for i in range(self.size))
+
+    def items(self):
+        return ((i, str(i)) for i in range(self.size))
@@ -0,0 +1,230 @@
+"""Persistent, bounded `key -> embedding` cache over memory-mapped fixed-width arrays.
+
+One cache lives in `EMBED_CACHE_DIR/<embed model>/<name>/`:
+- `meta.json`    embedding dimension and number of allocated slots
+- `vectors.f32`  float32 `[slots, dim]`, one vector per slot
+- `keys.bin`     16-byte BLAKE2b digest of the key stored in each slot (all zeros = empty)
+- `ticks.i64`    int64 last-use counter per slot, for LRU eviction
+- `writes.i64`   number of `put_many` calls so far, shared by every process using the cache
+- `lock`         held (`flock`) while a process writes
+
+The slot table is rebuilt from `keys.bin` on open, so a restart keeps the warm state. Files grow
+(doubling) as entries are added, up to `capacity` slots; after that the least recently used
+entries are overwritten. Writes go straight into the mapped files, i.e. the OS page cache, so they
+survive a crash of the process (an index build resumes from whatever was embedded before it);
+`flush()` forces them to disk.
+
+Several processes (server workers, the Flask and ASGI servers, an index build) may share a cache
+directory. Writers take the file lock, and a writer that finds `writes.i64` moved on since its
+last write re-reads the slot table first, so two processes never hand out the same free slot.
+Readers check the key stored in a slot before returning its vector, so a slot another process has
+reused since counts as a miss.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+import config
+
+
+KEY_BYTES = 16
+MIN_SLOTS = 1024
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+@contextmanager
+def _exclusive(path: str):
+    """Hold an exclusive lock on the file at `path` (shared between processes)."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def cache_dir(embed_model: str, name: str) -> str:
+    safe_model = "".join(c if c.isalnum() or c in "-_." else "_" for c in embed_model)
+    return os.path.join(config.EMBED_CACHE_DIR, safe_model, name)
+
+
+class EmbeddingCache:
+    """LRU-bounded embedding cache for one embedding model; keys are arbitrary strings."""
+
+    def __init__(self, embed_model: str, name: str, capacity: int):
+        self.embed_model = embed_model
+        self.capacity = capacity
+        self.path = cache_dir(embed_model, name)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.dim = None
+        self._allocated = 0
+        self._slots: Dict[bytes, int] = {}
+        self._vectors = self._keys = self._ticks = None
+        self._tick = 0
+        with open(self._file("writes.i64"), "ab") as f:
+            if f.tell() < 8:
+                f.truncate(8)
+        self._writes = np.memmap(self._file("writes.i64"), dtype=np.int64, mode="r+", shape=(1,))
+        with _exclusive(self._file("lock")):
+            self._load()
+        # Never shrink below what is already stored (occupied slots must stay contiguous)
+        self.capacity = max(capacity, len(self._slots))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        """Map the files at their current size and rebuild the slot table (call with the file lock held)."""
+        self._seen_writes = int(self._writes[0])
+        try:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return
+        self.dim = meta["dim"]
+        if meta["slots"] != self._allocated:
+            self._map(meta["slots"])
+        keys = self._keys.tolist()
+        self._slots = {key.ljust(KEY_BYTES, b"\0"): slot for slot, key in enumerate(keys) if key}
+        self._tick = max(self._tick, int(self._ticks.max(initial=0)) + 1)
+
+    def _map(self, slots: int) -> None:
+        """(Re)map the files with room for `slots` entries, extending them with empty slots if needed."""
+        for name, width in (("vectors.f32", 4 * self.dim), ("keys.bin", KEY_BYTES), ("ticks.i64", 8)):
+            with open(self._file(name), "ab") as f:
+                if f.tell() < slots * width:
+                    f.truncate(slots * width)
+        self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+", shape=(slots, self.dim))
+        self._keys = np.memmap(self._file("keys.bin"), dtype=f"S{KEY_BYTES}", mode="r+", shape=(slots,))
+        self._ticks = np.memmap(self._file("ticks.i64"), dtype=np.int64, mode="r+", shape=(slots,))
+        self._allocated = slots
+        with open(self._file("meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"embed_model": self.embed_model, "dim": self.dim, "slots": slots}, f)
+        os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return `{key: vector}` for the keys that are cached (copies, safe to keep)."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                digest = _digest(key)
+                slot = self._slots.get(digest)
+                if slot is not None and bytes(self._keys[slot]).ljust(KEY_BYTES, b"\0") != digest:
+                    # Reused by another process since this one last read the slot table
+                    del self._slots[digest]
+                    slot = None
+                if slot is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                found[key] = np.array(self._vectors[slot])
+                self._ticks[slot] = self._tick
+                self._tick += 1
+        return found
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self.get_many([key]).get(key)
+
+    def _free_slots(self, count: int) -> np.ndarray:
+        """Slots for `count` new entries: unused ones first, then the least recently used."""
+        used = len(self._slots)
+        fresh = min(count, self.capacity - used)
+        slots = np.arange(used, used + fresh)
+        if used + fresh > self._allocated:
+            self._map(min(self.capacity, max(MIN_SLOTS, 2 * self._allocated, used + fresh)))
+        evict = count - fresh
+        if evict:
+            oldest = np.argpartition(self._ticks[:used], evict - 1)[:evict]
+            for slot in oldest:
+                del self._slots[bytes(self._keys[slot]).ljust(KEY_BYTES, b"\0")]
+            slots = np.concatenate([slots, oldest])
+        return slots
+
+    def put_many(self, items: Iterable[Tuple[str, Iterable[float]]]) -> None:
+        """Store `(key, vector)` pairs, evicting least recently used entries beyond `capacity`."""
+        entries = {}
+        for key, vector in items:
+            entries[_digest(key)] = np.asarray(vector, dtype=np.float32)
+        if not entries:
+            return
+        with self._lock, _exclusive(self._file("lock")):
+            if int(self._writes[0]) != self._seen_writes:
+                self._load()
+            if self.dim is None:
+                self.dim = len(next(iter(entries.values())))
+            for vector in entries.values():
+                if len(vector) != self.dim:
+                    raise ValueError(f"Embedding has {len(vector)} dimensions, cache at {self.path} holds {self.dim}")
+
+            existing = [(key, vector) for key, vector in entries.items() if key in self._slots]
+            # Entries beyond the cache size would only evict each other
+            new = [(key, vector) for key, vector in entries.items() if key not in self._slots]
+            new = new[:self.capacity - len(existing)]
+            # Existing entries are refreshed first, so they are the newest and never chosen for eviction
+            for key, vector in existing:
+                self._write(self._slots[key], key, vector)
+            for (key, vector), slot in zip(new, self._free_slots(len(new)).tolist()):
+                self._slots[key] = slot
+                self._write(slot, key, vector)
+            self._writes[0] += 1
+            self._seen_writes = int(self._writes[0])
+
+    def _write(self, slot: int, key: bytes, vector: np.ndarray) -> None:
+        self._vectors[slot] = vector
+        self._keys[slot] = key
+        self._ticks[slot] = self._tick
+        self._tick += 1
+
+    def put(self, key: str, vector: Iterable[float]) -> None:
+        self.put_many([(key, vector)])
+
+    def flush(self) -> None:
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._keys.flush()
+            self._ticks.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._slots),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_mb": round(self._allocated * (4 * (self.dim or 0) + KEY_BYTES + 8) / 1e6, 1)
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._vectors = self._keys = self._ticks = None
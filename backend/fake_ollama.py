@@ -0,0 +1,259 @@
+"""Local stand-in for the Ollama API, for benchmarking without any models installed.
+
+Implements the endpoints the app uses: `/api/tags`, `/api/ps`, `/api/embed` (and the legacy
+`/api/embeddings`) and `/api/generate` (streamed NDJSON or a single JSON body).
+
+- Embeddings are deterministic hashed bag-of-words vectors (unit length, `--dim` wide), so texts
+  sharing words land close together and retrieval behaves sensibly.
+- Generation streams `--tokens` tokens, sleeping `--token-delay-ms` between them after a prefill
+  delay proportional to the prompt length (`--prefill-ms-per-kchar`).
+- A model that is not loaded pays `--load-ms` on its first request and then stays loaded for its
+  `keep_alive` (Ollama's default is 5 minutes).
+- `--model-delay-ms MODEL=MS` adds a first-token delay for one model (e.g. to exercise routing),
+  and models not listed in `--models` are answered with Ollama's 404 error.
+
+    python backend/fake_ollama.py --port 11434 --token-delay-ms 20
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+
+import config
+
+
+DEFAULT_KEEP_ALIVE = 300.0
+_WORD_RE = re.compile(r"\w+")
+_ANSWER_WORDS = (
+    "Based on the provided context, the usual adult dose should be confirmed with a pharmacist "
+    "and the product label. Seek medical advice if symptoms persist or worsen."
+).split()
+
+
+@lru_cache(maxsize=200_000)
+def _word_vector(word: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector: the normalized sum of per-word random vectors."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        vector += _word_vector(word, dim)
+    norm = float(np.linalg.norm(vector))
+    if norm == 0:
+        vector = _word_vector("", dim).copy()
+        norm = float(np.linalg.norm(vector))
+    return (vector / norm).tolist()
+
+
+def parse_keep_alive(value) -> float:
+    """Ollama's keep_alive: seconds or a duration string ("30s", "5m", "1h"); negative = forever."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*", str(value))
+        if not match:
+            return DEFAULT_KEEP_ALIVE
+        seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+
+class FakeOllama:
+    """Shared state of the fake server: settings, loaded models and request counters."""
+
+    def __init__(self, dim: int = 768, tokens: int = 64, token_delay_ms: float = 20.0,
+                 prefill_ms_per_kchar: float = 0.0, embed_delay_ms: float = 0.0, load_ms: float = 0.0,
+                 models: List[str] = None, model_delays_ms: Dict[str, float] = None):
+        self.dim = dim
+        self.tokens = tokens
+        self.token_delay = token_delay_ms / 1000
+        self.prefill_per_char = prefill_ms_per_kchar / 1e6
+        self.embed_delay = embed_delay_ms / 1000
+        self.load_delay = load_ms / 1000
+        self.models = models or [config.LLM_MODEL_NAME, config.EMBED_MODEL_NAME]
+        self.model_delays = {m: ms / 1000 for m, ms in (model_delays_ms or {}).items()}
+        self._loaded: Dict[str, float] = {}  # model -> expiry (monotonic)
+        self._lock = threading.Lock()
+        self.counts = {"embed": 0, "embed_inputs": 0, "generate": 0, "loads": 0}
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += amount
+
+    def ensure_loaded(self, model: str, keep_alive) -> None:
+        """Pay the load delay when `model` is cold, then keep it for `keep_alive`."""
+        now = time.monotonic()
+        with self._lock:
+            cold = self._loaded.get(model, 0.0) <= now
+            if cold:
+                self.counts["loads"] += 1
+        if cold:
+            time.sleep(self.load_delay)
+        ttl = parse_keep_alive(keep_alive)
+        with self._lock:
+            if ttl == 0:
+                self._loaded.pop(model, None)
+            else:
+                self._loaded[model] = time.monotonic() + ttl
+
+    def loaded_models(self) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            return [m for m, expiry in self._loaded.items() if expiry > now]
+
+    def answer_tokens(self) -> List[str]:
+        return [(" " if i else "") + _ANSWER_WORDS[i % len(_ANSWER_WORDS)] for i in range(self.tokens)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOllama/1.0"
+
+    @property
+    def fake(self) -> FakeOllama:
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload) -> None:
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": m, "model": m} for m in self.fake.models]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [{"name": m, "model": m} for m in self.fake.loaded_models()]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+        model = data.get("model")
+        if model not in self.fake.models:
+            self._send_json({"error": f"model '{model}' not found"}, 404)
+            return
+
+        if self.path in ("/api/embed", "/api/embeddings"):
+            legacy = self.path == "/api/embeddings"
+            texts = data.get("prompt", "") if legacy else data.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            self.fake.ensure_loaded(model, data.get("keep_alive"))
+            self.fake.count("embed")
+            self.fake.count("embed_inputs", len(texts))
+            time.sleep(self.fake.embed_delay)
+            vectors = [fake_embedding(t, self.fake.dim) for t in texts]
+            self._send_json({"embedding": vectors[0]} if legacy else {"model": model, "embeddings": vectors})
+        elif self.path == "/api/generate":
+            self._generate(model, data)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _generate(self, model: str, data: Dict) -> None:
+        started = time.perf_counter()
+        self.fake.ensure_loaded(model, data.get("keep_alive"))
+        prompt = data.get("prompt") or ""
+        if not prompt:
+            # Ollama loads the model and returns immediately for an empty prompt
+            self._send_json({"model": model, "response": "", "done": True, "done_reason": "load"})
+            return
+
+        self.fake.count("generate")
+        time.sleep(len(prompt) * self.fake.prefill_per_char + self.fake.model_delays.get(model, 0.0))
+        tokens = self.fake.answer_tokens()
+        final = {"model": model, "response": "", "done": True, "done_reason": "stop",
+                 "prompt_eval_count": len(prompt) // 4, "eval_count": len(tokens)}
+
+        if not data.get("stream", True):
+            time.sleep(self.fake.token_delay * len(tokens))
+            final["response"] = "".join(tokens)
+            final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._send_json(final)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(self.fake.token_delay)
+                self._write_chunk({"model": model, "response": token, "done": False})
+            final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._write_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. a cancelled stream), as Ollama allows
+            self.close_connection = True
+
+
+def make_server(fake: FakeOllama, host: str = "127.0.0.1", port: int = 11434) -> ThreadingHTTPServer:
+    """Create (but do not start) a server; run `serve_forever()` in a thread to embed it in a benchmark."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.fake = fake
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama API for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=768, help="embedding dimension")
+    parser.add_argument("--tokens", type=int, default=64, help="tokens generated per answer")
+    parser.add_argument("--token-delay-ms", type=float, default=20.0, help="delay between streamed tokens")
+    parser.add_argument("--prefill-ms-per-kchar", type=float, default=0.0,
+                        help="delay before the first token per 1000 prompt characters")
+    parser.add_argument("--embed-delay-ms", type=float, default=0.0, help="delay per /api/embed call")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="cold model load time")
+    parser.add_argument("--models", nargs="+", help="model names to advertise (default: the configured ones)")
+    parser.add_argument("--model-delay-ms", action="append", default=[], metavar="MODEL=MS",
+                        help="extra first-token delay for one model (repeatable)")
+    args = parser.parse_args()
+
+    model_delays = {}
+    for item in args.model_delay_ms:
+        model, _, ms = item.rpartition("=")
+        model_delays[model] = float(ms)
+    fake = FakeOllama(args.dim, args.tokens, args.token_delay_ms, args.prefill_ms_per_kchar,
+                      args.embed_delay_ms, args.load_ms, args.models, model_delays)
+    server = make_server(fake, args.host, args.port)
+    print(f"🧪 Fake Ollama serving {fake.models} at http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Requests served: {fake.counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Loaded index versions and hot reload.
+
+A `LoadedIndex` bundles one version of the on-disk index (FAISS index, chunk store, BM25 postings
+and `meta.json`). The retriever publishes the current version with a single attribute assignment;
+each retrieval leases the version it started with (`acquire()` / `release()`), so a reload never
+changes the index under a running request. A replaced version is retired: its memory maps are
+closed as soon as the last request using it has released it.
+
+`data_preparation.py` writes `meta.json` last (and every other file through a rename), so a
+changed `meta.json` means a complete new version is on disk; `IndexWatcher` polls it.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from bm25 import BM25Index, bm25_exists
+import vector_index
+
+
+class IndexValidationError(RuntimeError):
+    """The index on disk cannot be served by this process (wrong embedding model, size mismatch...)."""
+
+
+def read_meta(index_dir: str) -> Dict:
+    with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class LoadedIndex:
+    """One index version, shared by the requests that leased it."""
+
+    def __init__(self, vectorstore, bm25, meta: Dict):
+        self.vectorstore = vectorstore
+        self.bm25 = bm25
+        self.meta = meta
+        self.version = meta.get("created_at")
+        self._users = 0
+        self._retired = False
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def dim(self) -> int:
+        return self.vectorstore.index.d
+
+    def acquire(self) -> bool:
+        """Lease this version for one retrieval; False if it has already been freed."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._users += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._retired and self._users == 0:
+                self._close()
+
+    def retire(self) -> None:
+        """Free this version once the requests still using it are done."""
+        with self._lock:
+            self._retired = True
+            if self._users == 0:
+                self._close()
+
+    def _close(self) -> None:
+        self._closed = True
+        self.vectorstore.docstore.close()
+        if isinstance(self.vectorstore.index, vector_index.ShardedIndex):
+            self.vectorstore.index.close()
+        # Dropping the last references unmaps the FAISS index and the BM25 arrays
+        self.vectorstore = self.bm25 = None
+        print(f"🧹 Freed index version {self.version}")
+
+    def warm(self, queries: int = 8) -> None:
+        """Run a few searches so the first requests on this version do not pay its page faults."""
+        if queries <= 0 or not self.vectorstore.index.ntotal:
+            return
+        vectors = np.random.default_rng(0).standard_normal((queries, self.dim)).astype(np.float32)
+        self.vectorstore.index.search(vectors, 10)
+        self.vectorstore.docstore.get(0)
+        if self.bm25 is not None:
+            self.bm25.search("pain treatment dose", 10)
+
+
+def load_index(index_dir: str, embeddings, embed_model: str, hybrid: bool = True,
+               strict: bool = False) -> LoadedIndex:
+    """Open the index in `index_dir`.
+
+    Raises `IndexValidationError` when `meta.json` names another embedding model. With `strict`
+    (used for reloads), a missing or unreadable `meta.json` is an error as well.
+    """
+    try:
+        meta = read_meta(index_dir)
+    except (OSError, ValueError) as e:
+        if strict:
+            raise IndexValidationError(f"No readable meta.json in {index_dir}: {e}")
+        meta = {}
+    built_with = meta.get("embed_model")
+    if built_with and built_with != embed_model:
+        raise IndexValidationError(f"Index was built with '{built_with}', but this server embeds with '{embed_model}'")
+
+    vectorstore = vector_index.load_vectorstore(index_dir, embeddings, shards=meta.get("shards", 1))
+    if meta.get("num_chunks") is not None and meta["num_chunks"] != vectorstore.index.ntotal:
+        vectorstore.docstore.close()
+        raise IndexValidationError(
+            f"meta.json lists {meta['num_chunks']} chunks but the index has {vectorstore.index.ntotal}"
+        )
+    bm25 = None
+    if hybrid:
+        if bm25_exists(index_dir):
+            bm25 = BM25Index(index_dir)
+        else:
+            print("⚠️ No BM25 index found next to the FAISS index; using vector search only")
+    return LoadedIndex(vectorstore, bm25, meta)
+
+
+class IndexWatcher:
+    """Call `on_change()` whenever `meta.json` in `index_dir` is replaced (polled every `interval` s)."""
+
+    def __init__(self, index_dir: str, on_change: Callable[[], None], interval: float = 5.0):
+        self.path = os.path.join(index_dir, "meta.json")
+        self.on_change = on_change
+        self.interval = interval
+        self._seen = self._signature()
+        self._thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            signature = self._signature()
+            if signature is None or signature == self._seen:
+                continue
+            self._seen = signature
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"⚠️ Index reload failed, still serving the previous version: {e}")
@@ -0,0 +1,194 @@
+"""Minimal Prometheus-style metrics (counters + histograms) and per-request stage timings.
+
+Observations take one lock and one bisect, so the hooks are cheap enough to leave on in
+production. `render()` produces the text exposition format served at `/metrics`.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+
+_registry: List = []
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values) -> None:
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _format_labels(self.labels, label_values, 'le="' + le + '"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at render time (omitted when the callback returns None)."""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], Optional[float]]):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value:.15g}"]
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- Metrics recorded by the retriever and the servers ----
+
+STAGE_SECONDS = Histogram(
+    "medai_stage_seconds",
+    "Time spent per answer stage (embed, search, prompt, ttft, generate).",
+    labels=("stage",)
+)
+TOKENS_PER_SECOND = Histogram(
+    "medai_generation_tokens_per_second",
+    "Generation speed after the first token.",
+    buckets=RATE_BUCKETS
+)
+CONTEXT_CHUNKS = Histogram("medai_context_chunks", "Retrieved chunks passed to the prompt (0 = no context).",
+                           buckets=(0, 1, 2, 3, 5, 10))
+GENERATED_TOKENS = Counter("medai_generated_tokens_total", "Tokens streamed back from the LLM.")
+ANSWERS = Counter("medai_answers_total", "Answers produced, by source.", labels=("source",))
+HTTP_REQUESTS = Counter("medai_http_requests_total", "Chat HTTP requests, by route and status.",
+                        labels=("route", "status"))
+HTTP_SECONDS = Histogram("medai_http_request_seconds", "Chat HTTP request latency.", labels=("route",))
+
+
+def _resident_memory_bytes() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return float(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_memory_bytes() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return float(peak if sys.platform == "darwin" else peak * 1024)
+
+
+RESIDENT_MEMORY = Gauge("medai_process_resident_memory_bytes", "Current resident memory.", _resident_memory_bytes)
+PEAK_MEMORY = Gauge("medai_process_peak_memory_bytes", "Peak resident memory.", _peak_memory_bytes)
+
+
+class RequestTimings:
+    """Stage timings for one request; each stage is also recorded in `STAGE_SECONDS`."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record_generation(self, first_token_at: float, finished_at: float, num_tokens: int) -> None:
+        """Record time-to-first-token (from request start), generation time and tokens/s."""
+        if first_token_at is None:
+            return
+        self.record("ttft", first_token_at - self.started)
+        gen_seconds = finished_at - first_token_at
+        self.record("generate", gen_seconds)
+        GENERATED_TOKENS.inc(amount=num_tokens)
+        if num_tokens > 1 and gen_seconds > 0:
+            rate = (num_tokens - 1) / gen_seconds
+            self.stages["tokens_per_s"] = rate
+            TOKENS_PER_SECOND.observe(rate)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds (tokens/s is left as a rate)."""
+        out = {k: round(v if k == "tokens_per_s" else v * 1000, 2) for k, v in self.stages.items()}
+        out["total"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return out
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """`Server-Timing` header value for a `RequestTimings.as_dict()` result (durations in ms)."""
+    return ", ".join(f"{stage};dur={ms}" for stage, ms in timings.items() if stage != "tokens_per_s")
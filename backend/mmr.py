@@ -0,0 +1,56 @@
+"""Relevance filtering and maximal-marginal-relevance (MMR) selection of retrieved chunks.
+
+Retrieval first gathers a wider candidate list (dense results, fused with BM25 results when hybrid
+is on) and reads the candidates' stored vectors back from FAISS. Candidates whose cosine similarity
+to the query is below `min_similarity` are dropped. From the rest, chunks are picked one at a time
+by
+
+    lambda_mult * sim(query, chunk) - (1 - lambda_mult) * max(sim(chunk, picked))
+
+so a chunk that mostly repeats an already picked one (e.g. its overlapping neighbour) gives way to
+one that adds other evidence. All similarities come from one matrix product; each pick is a
+vectorized update of the running "closest picked chunk" scores.
+"""
+
+from typing import List
+
+import numpy as np
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_vector, candidate_vectors: np.ndarray, k: int, lambda_mult: float = 0.7,
+               min_similarity: float = None) -> List[int]:
+    """Positions (into `candidate_vectors`) of up to `k` chosen candidates, in pick order.
+
+    Candidates are expected in rank order; ties go to the better ranked one. Returns an empty list
+    when no candidate reaches `min_similarity`.
+    """
+    if k <= 0 or not len(candidate_vectors):
+        return []
+    query = _unit_rows(np.asarray(query_vector, dtype=np.float32))
+    candidates = _unit_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    relevance = candidates @ query
+
+    eligible = np.arange(len(candidates))
+    if min_similarity is not None:
+        eligible = eligible[relevance >= min_similarity]
+    if not len(eligible):
+        return []
+    candidates, relevance = candidates[eligible], relevance[eligible]
+    similarity = candidates @ candidates.T
+
+    picked: List[int] = []
+    closest = np.zeros(len(candidates), dtype=np.float32)  # max similarity to a picked chunk (floored at 0)
+    available = np.ones(len(candidates), dtype=bool)
+    for _ in range(min(k, len(candidates))):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * closest
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(closest, similarity[best], out=closest)
+    return [int(eligible[p]) for p in picked]
@@ -0,0 +1,184 @@
+"""Latency-aware routing of generations over several Ollama models, with fallback and circuit breaking.
+
+For each model the router keeps the outcome and time-to-first-token of its last `window`
+generations. `route()` orders the candidate models for one request:
+
+- "fastest" policy: the primary (active, i.e. chosen with `POST /models`) model, as long as it is
+  healthy; the other models follow as fallbacks, fastest first by median time-to-first-token
+  (models without samples yet first, so a newly added model gets measured);
+- "length" policy: questions of `short_query_chars` or more are routed like "fastest"; shorter ones
+  go to the fastest healthy model, whichever it is.
+
+A model whose error rate over the window exceeds `max_error_rate` is unhealthy and only used after
+the healthy ones. After `failure_threshold` consecutive failures its circuit opens and it is
+skipped for `open_seconds`; after that one request at a time may probe it (half-open: `route()`
+hands the probe to a single request, which tries that model right after its first healthy candidate,
+so only when that one fails, or first when there is none; the probe's outcome, or another
+`open_seconds` without one, frees it).
+One success closes the circuit again while one failure re-opens it. Models whose circuit is open or
+already being probed are still tried last, longest-open first, rather than failing the request.
+
+The caller tries the candidates in order and reports each attempt with `record_success()` /
+`record_failure()`; falling back is only possible before the first token has been streamed.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+POLICIES = ("fastest", "length")
+
+
+class ModelHealth:
+    """Rolling outcomes and circuit state of one model; guarded by the router's lock."""
+
+    def __init__(self, window: int):
+        self.samples: Deque[Tuple[bool, Optional[float]]] = deque(maxlen=window)  # (ok, ttft seconds)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None  # a request is probing the half-open circuit
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.circuit_opens = 0
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(not ok for ok, _ in self.samples) / len(self.samples)
+
+    def latencies(self) -> List[float]:
+        return [ttft for ok, ttft in self.samples if ok and ttft is not None]
+
+    def median_latency(self) -> float:
+        latencies = self.latencies()
+        return float(np.median(latencies)) if latencies else 0.0
+
+    def circuit(self, now: float, open_seconds: float) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if now - self.opened_at < open_seconds else "half_open"
+
+    def take_probe(self, now: float, open_seconds: float) -> bool:
+        """Claim the half-open probe slot; a probe that never reported back frees it after `open_seconds`."""
+        if self.probe_started is not None and now - self.probe_started < open_seconds:
+            return False
+        self.probe_started = now
+        return True
+
+
+class ModelRouter:
+    """Orders models per request by recent latency and health; see the module docstring."""
+
+    def __init__(self, models: List[str], policy: str = "fastest", window: int = 50,
+                 max_error_rate: float = 0.5, failure_threshold: int = 3, open_seconds: float = 30.0,
+                 short_query_chars: int = 200):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown routing policy '{policy}'; expected one of {', '.join(POLICIES)}")
+        self.models = list(dict.fromkeys(models))
+        self.policy = policy
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.short_query_chars = short_query_chars
+        self._health: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth(self.window)
+        return health
+
+    def route(self, query: str, primary: str) -> List[str]:
+        """Models to try for one request, best first; `primary` is the active model."""
+        now = time.monotonic()
+        pool = list(dict.fromkeys([primary] + self.models))
+        with self._lock:
+            health = {model: self._get(model) for model in pool}
+            usable, probes = [], []
+            for model in pool:
+                circuit = health[model].circuit(now, self.open_seconds)
+                if circuit == "closed":
+                    usable.append(model)
+                elif circuit == "half_open" and health[model].take_probe(now, self.open_seconds):
+                    probes.append(model)
+            blocked = sorted((m for m in pool if m not in usable and m not in probes),
+                             key=lambda m: health[m].opened_at)
+
+            def speed(model):
+                h = health[model]
+                return h.error_rate() > self.max_error_rate, h.median_latency(), pool.index(model)
+
+            ordered = sorted(usable, key=speed)
+            healthy_primary = primary in usable and health[primary].error_rate() <= self.max_error_rate
+            short = self.policy == "length" and len(query) < self.short_query_chars
+            if healthy_primary and not short:
+                ordered.remove(primary)
+                ordered.insert(0, primary)
+            # A probe may hang until the first-token timeout, so it never delays a healthy model
+            lead = ordered[:1] if ordered and health[ordered[0]].error_rate() <= self.max_error_rate else []
+        return lead + probes + ordered[len(lead):] + blocked
+
+    def set_models(self, models: List[str]) -> None:
+        """Replace the models routed over; models no longer listed lose their health and circuit state."""
+        with self._lock:
+            self.models = list(dict.fromkeys(models))
+            for model in list(self._health):
+                if model not in self.models:
+                    del self._health[model]
+
+    def record_success(self, model: str, ttft_seconds: float) -> None:
+        """`model` produced its first token after `ttft_seconds`."""
+        with self._lock:
+            health = self._get(model)
+            health.requests += 1
+            health.samples.append((True, ttft_seconds))
+            health.consecutive_failures = 0
+            health.opened_at = health.probe_started = None
+
+    def record_failure(self, model: str, timed_out: bool = False) -> None:
+        """`model` failed (or did not answer in time); opens its circuit after repeated failures."""
+        with self._lock:
+            health = self._get(model)
+            health.requests += 1
+            health.failures += 1
+            health.timeouts += timed_out
+            health.samples.append((False, None))
+            health.consecutive_failures += 1
+            health.probe_started = None
+            half_open = health.circuit(time.monotonic(), self.open_seconds) == "half_open"
+            if half_open or (health.opened_at is None and health.consecutive_failures >= self.failure_threshold):
+                health.opened_at = time.monotonic()
+                health.circuit_opens += 1
+                print(f"⚡ Circuit opened for {model} after {health.consecutive_failures} failures")
+
+    def record_fallback(self, model: str) -> None:
+        """A request gave up on `model` and moved on to the next candidate."""
+        with self._lock:
+            self._get(model).fallbacks += 1
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        models = {}
+        with self._lock:
+            for model, health in self._health.items():
+                latencies = health.latencies()
+                models[model] = {
+                    "circuit": health.circuit(now, self.open_seconds),
+                    "requests": health.requests,
+                    "failures": health.failures,
+                    "timeouts": health.timeouts,
+                    "fallbacks": health.fallbacks,
+                    "circuit_opens": health.circuit_opens,
+                    "error_rate": round(health.error_rate(), 3),
+                    "ttft_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies else None,
+                    "ttft_p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else None
+                }
+        return {"policy": self.policy, "models": models}
@@ -0,0 +1,117 @@
+"""Near-duplicate chunk detection with MinHash signatures and LSH banding.
+
+Chunks that are byte-for-byte equal are already skipped by their content hash; this catches the
+ones that differ only slightly: boilerplate repeated across leaflets (with a different product
+name), the same guideline in two editions, re-extracted pages with different whitespace.
+
+Each chunk is reduced to the set of its word `shingle_words`-grams. A MinHash signature of
+`num_perm` values estimates the Jaccard similarity of two such sets (the fraction of positions
+where the signatures agree). Signatures are split into `bands` bands; chunks sharing any band are
+candidates, and a candidate is a duplicate when the estimated similarity reaches `threshold`.
+Memory is about `4 * num_perm` bytes plus `bands` table entries per kept chunk.
+"""
+
+import re
+import zlib
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class NearDuplicateFilter:
+    """Keeps the first of each group of near-identical chunks and drops the others."""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16,
+                 shingle_words: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        # Universal hashing (a * x + b) mod p, one (a, b) pair per permutation
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 1 << 63, num_perm // bands, dtype=np.uint64)
+
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+
+        self.seen = 0
+        self.dropped = 0
+        self.dropped_chars = 0
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = _TOKEN_RE.findall(text.lower())
+        n = self.shingle_words
+        grams = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self._shingles(text)
+        hashed = (np.outer(self._a, shingles) + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        rows = signature.astype(np.uint64).reshape(self.bands, -1)
+        return (rows * self._band_mix).sum(axis=1).tolist()  # wraps mod 2**64, which is fine for a key
+
+    def _find(self, signature: np.ndarray, keys: List[int]) -> int:
+        """Position of a kept chunk similar enough to `signature`, or -1."""
+        checked = set()
+        for band, key in enumerate(keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+        return -1
+
+    def _keep(self, signature: np.ndarray, keys: List[int]) -> None:
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(position)
+
+    def add(self, text: str) -> None:
+        """Register an already indexed chunk (e.g. before appending to an existing index)."""
+        signature = self.signature(text)
+        self._keep(signature, self._band_keys(signature))
+
+    def is_duplicate(self, text: str) -> bool:
+        """True if `text` nearly duplicates a chunk seen before; otherwise remember it and return False."""
+        signature = self.signature(text)
+        keys = self._band_keys(signature)
+        if self._find(signature, keys) >= 0:
+            return True
+        self._keep(signature, keys)
+        return False
+
+    def filter(self, chunks: Iterable[Document]) -> Iterator[Document]:
+        """Yield the chunks that are not near duplicates of an earlier one."""
+        for chunk in chunks:
+            self.seen += 1
+            if self.is_duplicate(chunk.page_content):
+                self.dropped += 1
+                self.dropped_chars += len(chunk.page_content)
+                continue
+            yield chunk
+
+    def report(self, dim: int = None) -> str:
+        share = self.dropped / self.seen if self.seen else 0.0
+        text = (f"Near-duplicate filter dropped {self.dropped} of {self.seen} chunks ({share:.1%}, "
+                f"{self.dropped_chars / 1e6:.1f} MB of text)")
+        if dim and self.dropped:
+            text += f"; that is {self.dropped} fewer embeddings and ~{self.dropped * dim * 4 / 1e6:.1f} MB less index"
+        return text
+
+    def stats(self) -> Dict:
+        return {"chunks_seen": self.seen, "near_duplicates_dropped": self.dropped, "threshold": self.threshold}
@@ -1,7 +1,19 @@
-"""Simple helper for communicating with Ollama REST API to list installed models."""
+"""Simple helpers for communicating with the Ollama REST API.
 
+`list_models`, `embed` and `generate_stream` are synchronous helpers used by the Flask app;
+`AsyncOllamaClient` is used by the asyncio serving path (`asgi_app.py`) and keeps a pool of
+keep-alive HTTP connections.
+"""
+
+import json
 import requests
-from typing import List
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Union
+
+import httpx
+
+
+# Ollama keep_alive: seconds, or a duration string such as "30m"; negative keeps the model loaded forever
+KeepAlive = Optional[Union[int, float, str]]
 
 
 def _extract_names_from_response(data) -> List[str]:
@@ -68,3 +80,160 @@ def list_models(base_url: str) -> List[str]:
             dedup.append(m)
     return dedup
 
+
+# Shared session so repeated embedding calls reuse keep-alive connections
+_session = requests.Session()
+
+
+def embed(base_url: str, model: str, texts: List[str], timeout: float = 60,
+          keep_alive: KeepAlive = None) -> List[List[float]]:
+    """Embed a batch of texts with a single `/api/embed` call.
+
+    Unlike `list_models`, errors are raised: callers cannot answer without the vectors.
+    """
+    url = base_url.rstrip("/") + "/api/embed"
+    payload = {"model": model, "input": texts}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    r = _session.post(url, json=payload, timeout=timeout)
+    r.raise_for_status()
+    embeddings = r.json().get("embeddings")
+    if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+        raise ValueError(f"Ollama returned {len(embeddings or [])} embeddings for {len(texts)} inputs")
+    return embeddings
+
+
+def load_model(base_url: str, model: str, keep_alive: KeepAlive = None, embedding: bool = False,
+               timeout: float = 300) -> None:
+    """Load `model` into Ollama's memory (a no-op if it is already loaded) and set its keep-alive.
+
+    Generative models are loaded with an empty-prompt `/api/generate`; embedding models cannot
+    generate, so they embed a short text instead. Errors are raised.
+    """
+    if embedding:
+        embed(base_url, model, ["warm-up"], timeout=timeout, keep_alive=keep_alive)
+        return
+    payload = {"model": model, "keep_alive": keep_alive}
+    r = _session.post(base_url.rstrip("/") + "/api/generate", json=payload, timeout=timeout)
+    r.raise_for_status()
+    if r.json().get("error"):
+        raise RuntimeError(r.json()["error"])
+
+
+def _stream_tokens(lines) -> Iterator[str]:
+    for line in lines:
+        if not line:
+            continue
+        chunk = json.loads(line)
+        if chunk.get("error"):
+            raise RuntimeError(chunk["error"])
+        if chunk.get("response"):
+            yield chunk["response"]
+        if chunk.get("done"):
+            break
+
+
+def generate_stream(base_url: str, model: str, prompt: str, options: Optional[Dict] = None,
+                    keep_alive: KeepAlive = None, read_timeout: float = 120) -> Iterator[str]:
+    """Yield completion tokens from a streamed `/api/generate` call.
+
+    `read_timeout` bounds every wait for data: for the first token (model load and prompt
+    evaluation), then between tokens. Closing the generator drops the connection, which makes
+    Ollama stop generating.
+    """
+    payload = {"model": model, "prompt": prompt, "stream": True, "options": options or {}}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    with _session.post(base_url.rstrip("/") + "/api/generate", json=payload, stream=True,
+                       timeout=(5, read_timeout)) as r:
+        r.raise_for_status()
+        yield from _stream_tokens(r.iter_lines())
+
+
+def is_timeout(error: Exception) -> bool:
+    """True for the timeouts raised by the sync and async generation calls."""
+    return isinstance(error, (requests.Timeout, httpx.TimeoutException, TimeoutError))
+
+
+class AsyncOllamaClient:
+    """Minimal async Ollama client (embeddings + generation) over a pooled `httpx.AsyncClient`.
+
+    Create it inside the running event loop and `await close()` on shutdown.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = 32, timeout: float = 120.0,
+                 keep_alive: KeepAlive = None):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    def _payload(self, **fields) -> Dict:
+        if self.keep_alive is not None:
+            fields["keep_alive"] = self.keep_alive
+        return fields
+
+    async def list_models(self) -> List[str]:
+        """Async counterpart of `list_models`; returns an empty list on any error."""
+        try:
+            r = await self._client.get("/api/tags", timeout=5.0)
+            r.raise_for_status()
+            data = r.json()
+        except Exception as e:
+            print(f"⚠️ Ollama request failed: {e}")
+            return []
+        models = []
+        if isinstance(data, dict) and "models" in data:
+            for item in data["models"]:
+                if isinstance(item, dict) and item.get("name") and item["name"] not in models:
+                    models.append(item["name"])
+        return models
+
+    async def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts with one `/api/embed` call."""
+        r = await self._client.post("/api/embed", json=self._payload(model=model, input=texts))
+        r.raise_for_status()
+        embeddings = r.json().get("embeddings")
+        if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+            raise ValueError(f"Ollama returned {len(embeddings or [])} embeddings for {len(texts)} inputs")
+        return embeddings
+
+    async def generate(self, model: str, prompt: str, options: Optional[Dict] = None) -> str:
+        """Generate a full completion (non-streaming)."""
+        payload = self._payload(model=model, prompt=prompt, stream=False, options=options or {})
+        r = await self._client.post("/api/generate", json=payload)
+        r.raise_for_status()
+        return r.json().get("response", "")
+
+    async def generate_stream(self, model: str, prompt: str, options: Optional[Dict] = None,
+                              read_timeout: float = None) -> AsyncIterator[str]:
+        """Yield completion tokens as Ollama produces them (NDJSON stream).
+
+        `read_timeout` (seconds) overrides the client's timeout for the first token and the gaps
+        between tokens.
+        """
+        payload = self._payload(model=model, prompt=prompt, stream=True, options=options or {})
+        extra = {}
+        if read_timeout is not None:
+            extra["timeout"] = httpx.Timeout(self._client.timeout.read, connect=5.0, read=read_timeout)
+        async with self._client.stream("POST", "/api/generate", json=payload, **extra) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
@@ -0,0 +1,153 @@
+"""Prompt assembly under a token budget.
+
+The prompt is laid out as a static instruction prefix (byte-identical on every request, so Ollama
+can reuse its evaluated prefix instead of re-running prefill over it), then the retrieved context
+(left out when retrieval found nothing relevant), then the question. Before the context is stuffed in:
+
+- exact duplicate chunks are dropped,
+- the overlap shared by neighbouring chunks (`CHUNK_OVERLAP`) is cut from the later chunk,
+- sentences already present in an earlier (higher-ranked) chunk are dropped,
+- chunks are added in rank order until the context budget is spent; the last one is cut at a
+  sentence boundary, and anything past the budget is left out.
+
+Token counts are estimated from character counts, which is close enough for budgeting.
+"""
+
+import re
+from typing import List, Sequence
+
+
+SYSTEM_PROMPT = """You are MedAI — a calm, professional, and medically intelligent assistant.
+
+Your role is to give accurate, concise, and trustworthy answers about:
+- Medicine, diseases, diagnosis, treatment, human biology, and wellness.
+- Reproductive and sexual health (including penis pain, menstruation, pregnancy, first-time sex, hygiene, contraception, etc.).
+Always answer these topics with clarity, empathy, and professionalism—without apologies.
+
+Guidelines:
+- Answer all medical or health-related questions directly and clearly.
+- For symptom-related questions, structure your answer as follows:
+  1. **Possible Causes**: List 2-3 common causes of the symptom (be specific).
+  2. **Immediate Care/Home Remedies**: Provide practical relief measures the person can take right now (e.g., rest, ice/heat, OTC medicines, dietary changes).
+  3. **When to See a Doctor**: Mention red flags or warning signs that require immediate medical attention.
+- For treatment/condition questions, provide practical information including common remedies or initial care before seeing a doctor.
+- For sensitive topics (reproductive health, sexual issues, etc.), provide the same professional medical answer as any other health question.
+- Never apologize or say you can't answer medical questions—just answer them.
+- Never mention any documents, retrieval systems, or external data.
+- Keep a confident, compassionate, professional tone.
+- Use clear formatting with headers or bullet points when appropriate.
+- Keep the answer concise but informative (4-8 sentences or structured points).
+"""
+
+# Overlaps shorter than this are treated as coincidence rather than shared chunk text
+MIN_OVERLAP_CHARS = 40
+# Sentences shorter than this ("Yes.", headings) are never treated as duplicates
+MIN_DEDUPE_SENTENCE_CHARS = 40
+# A chunk is only cut to fit the budget if at least this many tokens of it would remain
+MIN_PARTIAL_TOKENS = 32
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    return int(len(text) / chars_per_token) + 1 if text else 0
+
+
+def _overlap(head: str, tail: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `head` (up to `max_overlap` chars) that `tail` starts with."""
+    window = head[-max_overlap:]
+    probe = tail[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = window.find(probe)
+    while start != -1:
+        if tail.startswith(window[start:]):
+            return len(window) - start
+        start = window.find(probe, start + 1)
+    return 0
+
+
+def _split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END_RE.split(text) if s.strip()]
+
+
+def _sentence_key(sentence: str) -> str:
+    return _WHITESPACE_RE.sub(" ", sentence).strip().lower()
+
+
+def dedupe_chunks(chunks: Sequence[str], max_overlap: int) -> List[str]:
+    """Remove text each chunk shares with higher-ranked chunks; chunks left empty are dropped."""
+    kept: List[str] = []
+    seen = set()
+    for chunk in chunks:
+        chunk = chunk.strip()
+        chunk_key = _sentence_key(chunk)
+        if chunk_key in seen:
+            continue
+        seen.add(chunk_key)
+        for previous in kept:
+            # `previous` followed by `chunk` in the document, or the other way round
+            cut = _overlap(previous, chunk, max_overlap)
+            if cut:
+                chunk = chunk[cut:].lstrip()
+            cut = _overlap(chunk, previous, max_overlap)
+            if cut:
+                chunk = chunk[:-cut].rstrip()
+        sentences = []
+        for sentence in _split_sentences(chunk):
+            key = _sentence_key(sentence)
+            if len(key) >= MIN_DEDUPE_SENTENCE_CHARS:
+                if key in seen:
+                    continue
+                seen.add(key)
+            sentences.append(sentence.strip())
+        if sentences:
+            kept.append(" ".join(sentences))
+    return kept
+
+
+def _truncate(text: str, max_tokens: int, chars_per_token: float) -> str:
+    """Cut `text` to about `max_tokens`, at the last sentence end that fits (or a word boundary)."""
+    limit = int(max_tokens * chars_per_token)
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if end > limit // 2:
+        return cut[:end + 1]
+    return cut.rsplit(" ", 1)[0] + " …"
+
+
+class PromptBuilder:
+    """Build `SYSTEM_PROMPT + context + question` prompts with at most `context_tokens` of context."""
+
+    def __init__(self, context_tokens: int, chars_per_token: float = 4.0, max_overlap: int = 0,
+                 system_prompt: str = SYSTEM_PROMPT):
+        self.context_tokens = context_tokens
+        self.chars_per_token = chars_per_token
+        self.max_overlap = max_overlap
+        self.system_prompt = system_prompt
+
+    def fit_context(self, chunks: Sequence[str]) -> List[str]:
+        """Deduplicated chunks, in rank order, trimmed to the context budget."""
+        budget = self.context_tokens
+        fitted = []
+        for chunk in dedupe_chunks(chunks, self.max_overlap):
+            tokens = estimate_tokens(chunk, self.chars_per_token)
+            if tokens > budget:
+                if budget >= MIN_PARTIAL_TOKENS:
+                    fitted.append(_truncate(chunk, budget, self.chars_per_token))
+                break
+            fitted.append(chunk)
+            budget -= tokens
+        return fitted
+
+    def build(self, question: str, chunks: Sequence[str], history: str = "") -> str:
+        """The prompt; `history` (a conversation summary and recent turns) goes after the static prefix."""
+        context = "\n\n".join(self.fit_context(chunks))
+        conversation = f"Conversation so far:\n{history}\n\n" if history else ""
+        # No relevant chunks: leave the section out rather than sending an empty one
+        context = f"Context:\n{context}\n\n" if context else ""
+        return (f"{self.system_prompt}\n{conversation}{context}"
+                f"Question:\n{question.strip()}\n\nAnswer:")
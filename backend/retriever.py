@@ -1,15 +1,57 @@
-from typing import Dict
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Tuple
+import asyncio
 import os
-import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import faiss
+import numpy as np
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain_community.llms import Ollama
-from langchain_community.vectorstores import FAISS
-from langchain.prompts import PromptTemplate
-from langchain.chains import RetrievalQA
 
+from answer_cache import SemanticAnswerCache, normalize_query
+from batching import MicroBatcher
+from conversation import (CONDENSE_PROMPT, SUMMARY_PROMPT, ConversationStore, clean_standalone_question,
+                          format_turns)
+from bm25 import reciprocal_rank_fusion
+from embedding_cache import EmbeddingCache
+from mmr import mmr_select
+from model_router import ModelRouter
+from metrics import ANSWERS, CONTEXT_CHUNKS, RequestTimings
+from prompt_builder import PromptBuilder
+from singleflight import SingleFlight
+from warmup import ModelWarmer
+import live_index
+import ollama_client
+import vector_index
 import config
 
 
+class ActiveLLM(NamedTuple):
+    """Immutable snapshot of the model currently serving requests.
+
+    `update_llm` publishes a new snapshot with a single attribute assignment, so a request that
+    read the snapshot keeps a consistent model/client pair even while a switch happens.
+    """
+    model: str
+    llm: Ollama
+
+
+class GenerationParams(NamedTuple):
+    """Per-request generation settings, resolved once and passed down explicitly.
+
+    With `routed`, the router picks the model per question (`MedicalRetriever._route`): `model` is
+    the preferred model until then, and afterwards the first candidate, with `fallbacks` the rest.
+    """
+    model: str
+    llm: Ollama
+    temperature: float
+    k: int
+    routed: bool = False
+    fallbacks: Tuple[str, ...] = None
+
+
 class MedicalRetriever:
     def __init__(self, llm_model: str = None):
         """Initialize the medical retriever with Ollama models and FAISS.
@@ -19,7 +61,6 @@ class MedicalRetriever:
         """
         # Single embedding model (no dynamic embedding switching)
         self.embed_model = config.EMBED_MODEL_NAME
-        self.llm_model = llm_model or config.LLM_MODEL_NAME
 
         # Initialize embeddings using the single configured embedding model
         self.embeddings = OllamaEmbeddings(
@@ -27,118 +68,980 @@ class MedicalRetriever:
             model=self.embed_model
         )
 
+        # Query embeddings persisted across restarts, keyed by normalized query (None when disabled)
+        self.query_embeddings = None
+        if config.QUERY_EMBED_CACHE_ENABLED:
+            self.query_embeddings = EmbeddingCache(self.embed_model, "queries", config.QUERY_EMBED_CACHE_CAPACITY)
+
+        # Per-session conversation memory for follow-up questions (None when disabled)
+        self.conversations = None
+        if config.CONVERSATION_ENABLED:
+            self.conversations = ConversationStore(
+                self._summarize,
+                max_sessions=config.CONVERSATION_MAX_SESSIONS,
+                ttl_seconds=config.CONVERSATION_TTL_SECONDS,
+                recent_turns=config.CONVERSATION_RECENT_TURNS,
+                turn_chars=config.CONVERSATION_TURN_CHARS
+            )
+
+        # Answer cache in front of retrieval + generation (None when disabled)
+        self.answer_cache = None
+        if config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+                similarity_threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD
+            )
+
+        # Identical concurrent questions share one retrieval + generation (None when disabled)
+        self.flights = SingleFlight() if config.COALESCE_REQUESTS else None
+
+        # Generations go to the fastest healthy model, with fallback (None when disabled)
+        self.router = None
+        if config.ROUTER_ENABLED:
+            self.router = ModelRouter(
+                config.SELECTED_LLM_MODELS,
+                policy=config.ROUTER_POLICY,
+                window=config.ROUTER_WINDOW,
+                max_error_rate=config.ROUTER_MAX_ERROR_RATE,
+                failure_threshold=config.ROUTER_FAILURE_THRESHOLD,
+                open_seconds=config.ROUTER_OPEN_SECONDS,
+                short_query_chars=config.ROUTER_SHORT_QUERY_CHARS
+            )
+
         # Load FAISS index
-        self.vectorstore = FAISS.load_local(
-            config.FAISS_INDEX_PATH,
-            self.embeddings,
-            allow_dangerous_deserialization=True
-        )
+        self._load_vectorstore()
+
+        # Coalesce concurrent query embeddings / FAISS searches into batches (None when disabled)
+        self.embed_batcher = None
+        self.search_batcher = None
+        if config.QUERY_BATCHING_ENABLED:
+            self.embed_batcher = MicroBatcher(
+                self._embed_batch,
+                max_batch_size=config.QUERY_BATCH_MAX_SIZE,
+                max_wait_ms=config.QUERY_BATCH_MAX_WAIT_MS,
+                name="embed-batcher"
+            )
+            self.search_batcher = MicroBatcher(
+                self._search_batch,
+                max_batch_size=config.QUERY_BATCH_MAX_SIZE,
+                max_wait_ms=config.QUERY_BATCH_MAX_WAIT_MS,
+                name="search-batcher"
+            )
 
         # Initialize LLM
-        self.llm = Ollama(
-            base_url=config.OLLAMA_BASE_URL,
-            model=self.llm_model
-        )
+        model = llm_model or config.LLM_MODEL_NAME
+        self._active = ActiveLLM(model, self._make_llm(model))
 
-        # ---- Persona and Behavior Template ----
-        self.prompt_template = PromptTemplate(
-            input_variables=["context", "question"],
-            template="""
-            You are MedAI — a calm, professional, and medically intelligent assistant.
-
-            Your role is to give accurate, concise, and trustworthy answers about:
-            - Medicine, diseases, diagnosis, treatment, human biology, and wellness.
-            - Reproductive and sexual health (including penis pain, menstruation, pregnancy, first-time sex, hygiene, contraception, etc.).
-            Always answer these topics with clarity, empathy, and professionalism—without apologies.
-
-            Guidelines:
-            - Answer all medical or health-related questions directly and clearly.
-            - For symptom-related questions, structure your answer as follows:
-              1. **Possible Causes**: List 2-3 common causes of the symptom (be specific).
-              2. **Immediate Care/Home Remedies**: Provide practical relief measures the person can take right now (e.g., rest, ice/heat, OTC medicines, dietary changes).
-              3. **When to See a Doctor**: Mention red flags or warning signs that require immediate medical attention.
-            - For treatment/condition questions, provide practical information including common remedies or initial care before seeing a doctor.
-            - For sensitive topics (reproductive health, sexual issues, etc.), provide the same professional medical answer as any other health question.
-            - Never apologize or say you can't answer medical questions—just answer them.
-            - Never mention any documents, retrieval systems, or external data.
-            - Keep a confident, compassionate, professional tone.
-            - Use clear formatting with headers or bullet points when appropriate.
-            - Keep the answer concise but informative (4-8 sentences or structured points).
-
-            Context:
-            {context}
-
-            Question:
-            {question}
-
-            Answer:
-            """
+        # Load the embedding model, the active LLM and the preloaded LLMs ahead of the first chat
+        self.warmer = ModelWarmer(
+            config.OLLAMA_BASE_URL,
+            self.embed_model,
+            keep_alive=config.OLLAMA_KEEP_ALIVE,
+            refresh_seconds=config.WARMUP_REFRESH_SECONDS
         )
+        self._preloaded_models = list(config.SELECTED_LLM_MODELS) if config.PRELOAD_SELECTED_MODELS else []
+        if config.WARMUP_ON_STARTUP:
+            self.warmer.start(self._models_to_keep_warm)
 
-        # ---- Retrieval QA Chain ----
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=self.vectorstore.as_retriever(search_kwargs={"k": 3}),
-            chain_type_kwargs={"prompt": self.prompt_template}
+        # Static instruction prefix + deduplicated, budgeted context + question
+        self.prompt_builder = PromptBuilder(
+            context_tokens=config.PROMPT_CONTEXT_TOKENS,
+            chars_per_token=config.PROMPT_CHARS_PER_TOKEN,
+            max_overlap=config.CHUNK_OVERLAP
         )
 
         print("✅ Medical retriever initialized successfully")
 
+    def _load_vectorstore(self):
+        """Load the FAISS index (and BM25 postings) from disk at startup."""
+        self._index = live_index.load_index(config.FAISS_INDEX_PATH, self.embeddings, self.embed_model,
+                                            hybrid=config.HYBRID_ENABLED)
+        self._reload_lock = threading.Lock()
+        self.index_reloads = 0
+        if config.INDEX_WATCH_SECONDS:
+            live_index.IndexWatcher(config.FAISS_INDEX_PATH, self.reload_index, config.INDEX_WATCH_SECONDS).start()
+
+    @property
+    def vectorstore(self):
+        return self._index.vectorstore
+
+    @property
+    def bm25(self):
+        return self._index.bm25
+
+    @property
+    def index_version(self):
+        return self._index.version
+
+    def reload_index(self) -> Dict:
+        """Load the index currently on disk and swap it in without interrupting requests.
+
+        The new version is validated (embedding model and dimension) and warmed up while the old
+        one keeps serving. It is then published in one assignment: retrievals already running
+        finish on the version they leased, and the old version is freed after the last of them.
+        Raises `live_index.IndexValidationError` (or the load error) and keeps the old version.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            new = live_index.load_index(config.FAISS_INDEX_PATH, self.embeddings, self.embed_model,
+                                        hybrid=config.HYBRID_ENABLED, strict=True)
+            old = self._index
+            if new.dim != old.dim:
+                new.retire()
+                raise live_index.IndexValidationError(
+                    f"Index has {new.dim}-dimensional vectors, the serving index has {old.dim}"
+                )
+            new.warm(config.INDEX_RELOAD_WARMUP_QUERIES)
+            self._index = new
+            # Answers were grounded in the previous index's chunks
+            if self.answer_cache:
+                self.answer_cache.clear()
+            old.retire()
+            self.index_reloads += 1
+            seconds = time.perf_counter() - start
+            print(f"🔄 Index reloaded: {old.version} -> {new.version} "
+                  f"({new.vectorstore.index.ntotal} chunks, {seconds * 1000:.0f} ms)")
+            return {
+                "index_version": new.version,
+                "previous_version": old.version,
+                "num_chunks": new.vectorstore.index.ntotal,
+                "load_ms": round(seconds * 1000, 1)
+            }
+
+    def _acquire_index(self) -> "live_index.LoadedIndex":
+        while True:
+            index = self._index
+            # Fails only if a reload retired and freed this version in between; re-read it then
+            if index.acquire():
+                return index
+
+    @staticmethod
+    def _make_llm(model: str) -> Ollama:
+        # Temperature is never set on the client; it is passed per call
+        return Ollama(base_url=config.OLLAMA_BASE_URL, model=model, keep_alive=config.OLLAMA_KEEP_ALIVE)
+
+    @property
+    def llm_model(self) -> str:
+        return self._active.model
+
+    @property
+    def llm(self) -> Ollama:
+        return self._active.llm
+
+    def _models_to_keep_warm(self) -> List[str]:
+        return [self.embed_model, self.llm_model] + self._preloaded_models
+
     def update_llm(self, new_llm_model: str):
-        """Switch the LLM model used for generation at runtime."""
+        """Switch the LLM model used for generation at runtime.
+
+        The new model is loaded into Ollama first (raising if it cannot be), so requests keep using
+        the previous model until the new one is hot. The new client is then published in one
+        assignment; requests already running keep the snapshot they started with.
+        """
         if not new_llm_model:
             return
         print(f"🔧 Updating LLM model to: {new_llm_model}")
-        self.llm_model = new_llm_model
-        self.llm = Ollama(base_url=config.OLLAMA_BASE_URL, model=self.llm_model)
-        # Recreate the chain to pick up new llm
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=self.vectorstore.as_retriever(search_kwargs={"k": 3}),
-            chain_type_kwargs={"prompt": self.prompt_template}
-        )
+        seconds = self.warmer.warm(new_llm_model)
+        print(f"🔥 {new_llm_model} ready ({seconds * 1000:.0f} ms)")
+        self._active = ActiveLLM(new_llm_model, self._make_llm(new_llm_model))
+        # The new model is the only selected one now (`config.SELECTED_LLM_MODELS`): stop routing to the others
+        if self.router:
+            self.router.set_models([new_llm_model])
+        # Answers generated by the previous model must not be served for the new one
+        if self.answer_cache:
+            self.answer_cache.clear()
+
+    def _resolve_params(self, temperature: float = None, llm_model: str = None,
+                        k: int = None) -> GenerationParams:
+        """Build the immutable parameters for one request from its arguments and the defaults.
+
+        Without an explicit `llm_model` the request is routed (when the router is enabled), with the
+        active model as the preferred one.
+        """
+        active = self._active
+        if llm_model and llm_model != active.model:
+            # One-off model override: a throwaway client, the shared snapshot is untouched
+            model, llm = llm_model, self._make_llm(llm_model)
+        else:
+            model, llm = active
+        if temperature is None:
+            temperature = config.DEFAULT_TEMPERATURE
+        routed = self.router is not None and not llm_model
+        return GenerationParams(model, llm, float(temperature), int(k or config.RETRIEVAL_K), routed)
 
     def get_state(self) -> Dict:
         """Return current model state for API/UI."""
         return {
             "embed_model": self.embed_model,
             "llm_model": self.llm_model,
-            "llm_models": config.SELECTED_LLM_MODELS
+            "llm_models": config.SELECTED_LLM_MODELS,
+            "models_ready": self.warmer.is_ready(self.embed_model) and self.warmer.is_ready(self.llm_model),
+            "model_warmup": self.warmer.stats(),
+            "index_version": self.index_version,
+            "index_reloads": self.index_reloads,
+            "index_type": vector_index.describe_index(self.vectorstore.index),
+            "index_shards": vector_index.num_shards(self.vectorstore.index),
+            "hybrid_retrieval": self.bm25 is not None,
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "conversations": self.conversations.stats() if self.conversations else None,
+            "coalescing": self.flights.stats() if self.flights else None,
+            "routing": self.router.stats() if self.router else None,
+            "query_embedding_cache": self.query_embeddings.stats() if self.query_embeddings is not None else None,
+            "query_batching": {
+                "embed": self.embed_batcher.stats(),
+                "search": self.search_batcher.stats()
+            } if self.embed_batcher else None
+        }
+
+    @staticmethod
+    def _describe_sources(docs: List) -> List[Dict]:
+        """Summarize retrieved chunks for the client (file name + page)."""
+        sources = []
+        for doc in docs:
+            meta = doc.metadata or {}
+            sources.append({
+                "source": os.path.basename(str(meta.get("source", ""))),
+                "page": meta.get("page")
+            })
+        return sources
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries with one Ollama `/api/embed` call."""
+        return ollama_client.embed(config.OLLAMA_BASE_URL, self.embed_model, texts,
+                                   keep_alive=config.OLLAMA_KEEP_ALIVE)
+
+    def _search_batch(self, queries: List) -> List[List[int]]:
+        """Run one FAISS search per index version for many `(index, query_vector, k)` requests.
+
+        Returns vector positions. Mirrors `FAISS.similarity_search_by_vector`, but with a matrix of
+        queries; a batch only spans two versions while a reload is being swapped in.
+        """
+        results: List[List[int]] = [None] * len(queries)
+        by_index: Dict[int, List[int]] = {}
+        for position, (index, _, _) in enumerate(queries):
+            by_index.setdefault(id(index), []).append(position)
+        for positions in by_index.values():
+            vectorstore = queries[positions[0]][0].vectorstore
+            max_k = max(queries[p][2] for p in positions)
+            matrix = np.asarray([queries[p][1] for p in positions], dtype=np.float32)
+            if vectorstore._normalize_L2:
+                faiss.normalize_L2(matrix)
+            _, indices = vectorstore.index.search(matrix, max_k)
+            for p, row in zip(positions, indices):
+                results[p] = [int(i) for i in row[:queries[p][2]] if i != -1]
+        return results
+
+    def _embed_query(self, query: str) -> List[float]:
+        """Query embedding from the persistent cache, else from Ollama (batched with concurrent queries)."""
+        key = normalize_query(query)
+        if self.query_embeddings is not None:
+            cached = self.query_embeddings.get(key)
+            if cached is not None:
+                return cached
+        if self.embed_batcher:
+            vector = self.embed_batcher.submit(query)
+        else:
+            vector = self._embed_batch([query])[0]
+        if self.query_embeddings is not None:
+            self.query_embeddings.put(key, vector)
+        return vector
+
+    def _search(self, index, query_vector, k: int) -> List[int]:
+        if self.search_batcher:
+            return self.search_batcher.submit((index, query_vector, k))
+        return self._search_batch([(index, query_vector, k)])[0]
+
+    @staticmethod
+    def _candidate_count(k: int) -> int:
+        """Chunks considered for the final top-k (MMR picks from a wider list)."""
+        return k * config.MMR_FETCH_MULTIPLIER if config.MMR_ENABLED else k
+
+    @classmethod
+    def _search_depth(cls, index, k: int) -> int:
+        # Fuse deeper candidate lists so a chunk ranked well by only one retriever can still win
+        depth = cls._candidate_count(k)
+        return depth * config.HYBRID_CANDIDATE_MULTIPLIER if index.bm25 else depth
+
+    @staticmethod
+    def _diversify(index, query_vector, ids: List[int], k: int) -> List[int]:
+        """Drop candidates below `RETRIEVAL_MIN_SIMILARITY` and pick up to k of the rest by MMR."""
+        if not ids:
+            return []
+        vectors = vector_index.reconstruct_vectors(index.vectorstore.index, ids)
+        picked = mmr_select(query_vector, vectors, k, lambda_mult=config.MMR_LAMBDA,
+                            min_similarity=config.RETRIEVAL_MIN_SIMILARITY)
+        return [ids[p] for p in picked]
+
+    @classmethod
+    def _collect_docs(cls, index, query: str, query_vector, dense_ids: List[int], k: int) -> List:
+        """Fuse the dense results with BM25 results when hybrid is on, select the top-k and load them."""
+        ids = dense_ids
+        candidates = cls._candidate_count(k)
+        if index.bm25:
+            ids = reciprocal_rank_fusion(
+                [dense_ids, index.bm25.search(query, len(dense_ids) or k)],
+                [config.HYBRID_DENSE_WEIGHT, config.HYBRID_BM25_WEIGHT],
+                rrf_k=config.HYBRID_RRF_K
+            )
+        ids = ids[:candidates]
+        if config.MMR_ENABLED:
+            ids = cls._diversify(index, query_vector, ids, k)
+        CONTEXT_CHUNKS.observe(len(ids))
+        return [index.vectorstore.docstore.get(i) for i in ids]
+
+    def _retrieve(self, query: str, query_vector, k: int) -> List:
+        """Up to k chunks for a query: dense FAISS results, fused with BM25 results when hybrid is on.
+
+        With `MMR_ENABLED`, weakly related chunks are dropped (possibly all of them) and the rest
+        diversified by MMR.
+        """
+        index = self._acquire_index()
+        try:
+            dense_ids = self._search(index, query_vector, self._search_depth(index, k))
+            return self._collect_docs(index, query, query_vector, dense_ids, k)
+        finally:
+            index.release()
+
+    def _retrieve_many(self, queries: List[str], query_vectors: List, k: int) -> List[List]:
+        """`_retrieve` for many queries with a single matrix search."""
+        index = self._acquire_index()
+        try:
+            depth = self._search_depth(index, k)
+            dense = self._search_batch([(index, vector, depth) for vector in query_vectors])
+            return [self._collect_docs(index, query, vector, ids, k)
+                    for query, vector, ids in zip(queries, query_vectors, dense)]
+        finally:
+            index.release()
+
+    def _lookup_cached(self, query: str, params: GenerationParams, timings: RequestTimings):
+        """Check the answer cache; returns (cached answer or None, query embedding).
+
+        The exact-text lookup runs before embedding so repeated questions skip Ollama entirely;
+        otherwise the embedding is computed once and reused for the FAISS search.
+        """
+        namespace = (params.model, params.temperature)
+        if self.answer_cache:
+            cached = self.answer_cache.lookup_exact(query, namespace)
+            if cached is not None:
+                return cached, None
+
+        with timings.stage("embed"):
+            query_vector = self._embed_query(query)
+        if self.answer_cache:
+            cached = self.answer_cache.lookup_similar(query, namespace, query_vector)
+            if cached is not None:
+                return cached, query_vector
+        return None, query_vector
+
+    def _store_cached(self, query: str, params: GenerationParams, answer: str, query_vector,
+                      timings: RequestTimings = None) -> None:
+        if timings is not None and "fallback" in timings.stages:
+            # Generated by a fallback model, not by `params.model` the cache entry would be keyed on
+            return
+        if self.answer_cache and answer:
+            self.answer_cache.store(query, (params.model, params.temperature), answer, query_vector)
+
+    def _build_prompt(self, query: str, docs: List, history: str = "") -> str:
+        return self.prompt_builder.build(query, [doc.page_content for doc in docs], history)
+
+    # ---- Conversation memory ----
+
+    def _conversation(self, session_id: str = None):
+        if not session_id or not self.conversations:
+            return None
+        return self.conversations.get(session_id)
+
+    def _summarize(self, summary: str, turns: List) -> str:
+        """Fold `turns` into the running summary (called by the conversation store's worker)."""
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=format_turns(turns))
+        return self.llm.invoke(prompt, temperature=0, num_predict=config.CONVERSATION_SUMMARY_TOKENS)
+
+    def _condense(self, params: GenerationParams, history: str, query: str) -> str:
+        """Rewrite a follow-up as a standalone question for retrieval; falls back to the query as asked."""
+        prompt = CONDENSE_PROMPT.format(history=history, question=query)
+        try:
+            rewritten = params.llm.invoke(prompt, temperature=0, num_predict=config.CONVERSATION_CONDENSE_TOKENS)
+        except Exception as e:
+            print(f"⚠️ Could not condense follow-up question: {e}")
+            return query
+        return clean_standalone_question(rewritten, query)
+
+    async def _acondense(self, client, params: GenerationParams, history: str, query: str) -> str:
+        prompt = CONDENSE_PROMPT.format(history=history, question=query)
+        options = {"temperature": 0, "num_predict": config.CONVERSATION_CONDENSE_TOKENS}
+        try:
+            rewritten = await client.generate(params.model, prompt, options)
+        except Exception as e:
+            print(f"⚠️ Could not condense follow-up question: {e}")
+            return query
+        return clean_standalone_question(rewritten, query)
+
+    def _finish_turn(self, conversation, question: str, answer: str) -> None:
+        if conversation is not None:
+            self.conversations.record(conversation, question, answer)
+
+    @staticmethod
+    def _cached_events(answer: str, timings: RequestTimings) -> List[Dict]:
+        ANSWERS.inc("cache")
+        return [
+            {"type": "sources", "sources": []},
+            {"type": "token", "token": answer},
+            {"type": "done", "success": True, "cached": True, "timings": timings.as_dict()}
+        ]
+
+    @staticmethod
+    def _error_event(e: Exception) -> Dict:
+        ANSWERS.inc("error")
+        return {
+            "type": "error",
+            "response": "I apologize, but I encountered an error. Please try again.",
+            "success": False,
+            "error": str(e)
         }
 
-    def get_answer(self, query: str, temperature: float = None) -> Dict:
+    @staticmethod
+    def _collect_answer(event: Dict, tokens: List[str]):
+        """Fold one streamed event into a `get_answer` result; returns the result once complete."""
+        if event["type"] == "token":
+            tokens.append(event["token"])
+        elif event["type"] == "done":
+            result = {"response": "".join(tokens), "success": True, "timings": event["timings"]}
+            for flag in ("cached", "coalesced"):
+                if event.get(flag):
+                    result[flag] = True
+            return result
+        elif event["type"] == "error":
+            return {key: event[key] for key in ("response", "success", "error")}
+        return None
+
+    def get_answer(self, query: str, temperature: float = None, llm_model: str = None,
+                   k: int = None, session_id: str = None) -> Dict:
         """
         Get an answer for a medical query.
+
+        temperature, llm_model and k apply to this call only; the shared LLM client is never mutated.
+        With a session_id, earlier turns of that session are taken into account (see `stream_answer`).
+        The answer is generated through `stream_answer`, so time-to-first-token is measured too.
+        """
+        tokens: List[str] = []
+        for event in self.stream_answer(query, temperature, llm_model, k, session_id):
+            result = self._collect_answer(event, tokens)
+            if result is not None:
+                return result
+
+    def stream_answer(self, query: str, temperature: float = None, llm_model: str = None,
+                      k: int = None, session_id: str = None) -> Iterator[Dict]:
         """
+        Stream an answer for a medical query as a sequence of events.
+
+        Yields a ``sources`` event as soon as retrieval finishes, then one ``token`` event per
+        chunk produced by Ollama, and finally a ``done`` event carrying per-stage ``timings`` (or an
+        ``error`` event). Cached answers are sent as a single token.
+
+        With a session_id, a follow-up is first rewritten into a standalone question (used for the
+        caches and retrieval) and the session's summarized history is included in the prompt.
+        """
+        timings = RequestTimings()
         try:
-            if temperature is not None:
-                self.llm.temperature = temperature
-
-            instruction = (
-                "You are a medical assistant. Answer all medical and health questions directly and clearly without apologies. "
-                "For symptom questions: explain possible causes, suggest immediate home remedies or OTC help, and mention when to see a doctor. "
-                "For treatment/condition questions: provide practical information and initial care options. "
-                "Answer questions about diseases, symptoms, treatment, reproductive health, sexual health, wellness, anatomy, etc. "
-                "Use clear formatting with headers or bullet points. Be helpful, professional, and compassionate. "
-                "Do not mention sources or databases."
-            )
+            params = self._resolve_params(temperature, llm_model, k)
+            conversation = self._conversation(session_id)
+            history = conversation.history() if conversation else ""
+            question = query
+            if history:
+                with timings.stage("condense"):
+                    question = self._condense(params, history, query)
+
+            if history or self.flights is None:
+                events = self._answer_events(question, params, history, timings)
+            else:
+                events = self._coalesced_events(question, params, timings)
+            tokens = []
+            for event in events:
+                if event["type"] == "token":
+                    tokens.append(event["token"])
+                elif event["type"] == "done":
+                    self._finish_turn(conversation, question, "".join(tokens))
+                yield event
 
-            question = instruction + f"\n\nQuestion: {query}"
+        except Exception as e:
+            print(f"Error streaming answer: {str(e)}")
+            yield self._error_event(e)
 
-            # Invoke QA chain
-            response = self.qa_chain.invoke(question)
+    def _route(self, params: GenerationParams, question: str) -> GenerationParams:
+        """Pick the models for a routed request; the answer cache and coalescing key on the first one."""
+        if not params.routed or params.fallbacks is not None:
+            return params
+        candidates = self.router.route(question, params.model)
+        model = candidates[0]
+        llm = params.llm if model == params.model else self._make_llm(model)
+        return params._replace(model=model, llm=llm, fallbacks=tuple(candidates[1:]))
 
-            return {
-                "response": response.get("result", str(response)),
-                "success": True
-            }
+    def _generate_tokens(self, params: GenerationParams, prompt: str, timings: RequestTimings) -> Iterator[str]:
+        """Stream the answer's tokens from Ollama, recording time-to-first-token and generation speed."""
+        count = 0
+        first_token_at = None
+        if params.fallbacks is not None:
+            stream = self._routed_tokens(params, prompt, timings)
+        else:
+            stream = params.llm.stream(prompt, temperature=params.temperature)
+        for token in stream:
+            if token:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                count += 1
+                yield token
+        timings.record_generation(first_token_at, time.perf_counter(), count)
+
+    def _routed_tokens(self, params: GenerationParams, prompt: str, timings: RequestTimings) -> Iterator[str]:
+        """Tokens from the first candidate model that answers in time.
+
+        A model that fails or sends no token within `ROUTER_FIRST_TOKEN_TIMEOUT` is reported to the
+        router and the next candidate is tried (the time lost is the "fallback" stage); the last one
+        gets the full `OLLAMA_TIMEOUT`. Once tokens have been streamed an error is raised as usual.
+        """
+        candidates = [params.model, *params.fallbacks]
+        options = {"temperature": params.temperature}
+        for n, model in enumerate(candidates):
+            fallback = n + 1 < len(candidates)
+            started = time.perf_counter()
+            answered = False
+            try:
+                for token in ollama_client.generate_stream(
+                        config.OLLAMA_BASE_URL, model, prompt, options, keep_alive=config.OLLAMA_KEEP_ALIVE,
+                        read_timeout=config.ROUTER_FIRST_TOKEN_TIMEOUT if fallback else config.OLLAMA_TIMEOUT):
+                    if not answered:
+                        answered = True
+                        self.router.record_success(model, time.perf_counter() - started)
+                    yield token
+                if not answered:
+                    self.router.record_success(model, time.perf_counter() - started)
+                return
+            except Exception as e:
+                self.router.record_failure(model, ollama_client.is_timeout(e))
+                if answered or not fallback:
+                    raise
+                self._fall_back(model, candidates[n + 1], e, timings, started)
+
+    def _fall_back(self, model: str, next_model: str, error: Exception, timings: RequestTimings,
+                   started: float) -> None:
+        self.router.record_fallback(model)
+        timings.record("fallback", time.perf_counter() - started)
+        print(f"⚠️ {model} failed ({type(error).__name__}: {error}); falling back to {next_model}")
+
+    def _answer_events(self, question: str, params: GenerationParams, history: str,
+                       timings: RequestTimings) -> Iterator[Dict]:
+        """Cache lookup, retrieval and generation for one (standalone) question; raises on failure."""
+        params = self._route(params, question)
+        cached, query_vector = self._lookup_cached(question, params, timings)
+        if cached is not None:
+            yield from self._cached_events(cached, timings)
+            return
+
+        with timings.stage("search"):
+            docs = self._retrieve(question, query_vector, params.k)
+        yield {"type": "sources", "sources": self._describe_sources(docs)}
+
+        with timings.stage("prompt"):
+            prompt = self._build_prompt(question, docs, history)
+
+        tokens = []
+        for token in self._generate_tokens(params, prompt, timings):
+            tokens.append(token)
+            yield {"type": "token", "token": token}
+
+        # Answers shaped by a conversation's history are not reused for other users
+        if not history:
+            self._store_cached(question, params, "".join(tokens), query_vector, timings)
+        ANSWERS.inc("llm")
+        yield {"type": "done", "success": True, "timings": timings.as_dict()}
+
+    def _coalesced_events(self, question: str, params: GenerationParams,
+                          timings: RequestTimings) -> Iterator[Dict]:
+        """`_answer_events`, shared with concurrent requests for the same question and settings."""
+        params = self._route(params, question)
+        key, flight, leader = self._join_flight(question, params)
+        if leader:
+            events = self._answer_events(question, params, "", timings)
+            threading.Thread(target=self.flights.run, args=(key, flight, events),
+                             name="single-flight", daemon=True).start()
+        for event in flight.follow():
+            yield event if leader else self._follower_event(event, timings)
+
+    # ---- Request coalescing ----
+
+    def _join_flight(self, question: str, params: GenerationParams):
+        """Join the flight for `question`; `params` must be routed already, so the key has the chosen model."""
+        key = (normalize_query(question), params.model, params.temperature)
+        flight, leader = self.flights.join(key)
+        return key, flight, leader
+
+    @staticmethod
+    def _follower_event(event: Dict, timings: RequestTimings) -> Dict:
+        """A leader's event as seen by a coalesced request: its own total, the leader's stages."""
+        if event["type"] != "done":
+            return event
+        ANSWERS.inc("coalesced")
+        return {**event, "coalesced": True, "timings": {**event["timings"], "total": timings.as_dict()["total"]}}
+
+    # ---- Async path (used by asgi_app.py) ----
+
+    async def _aembed_query(self, client, query: str) -> List[float]:
+        """`_embed_query` for the event loop.
+
+        With batching on, the query joins the shared embed batcher from a worker thread, so concurrent
+        async and sync requests are embedded together; otherwise it uses the async Ollama client.
+        """
+        if self.embed_batcher:
+            return await asyncio.to_thread(self._embed_query, query)
+        key = normalize_query(query)
+        query_vector = self.query_embeddings.get(key) if self.query_embeddings is not None else None
+        if query_vector is None:
+            query_vector = (await client.embed(self.embed_model, [query]))[0]
+            if self.query_embeddings is not None:
+                self.query_embeddings.put(key, query_vector)
+        return query_vector
+
+    async def _alookup_cached(self, client, query: str, params: GenerationParams, timings: RequestTimings):
+        """Async counterpart of `_lookup_cached`; see `_aembed_query` for how the query is embedded."""
+        namespace = (params.model, params.temperature)
+        if self.answer_cache:
+            cached = self.answer_cache.lookup_exact(query, namespace)
+            if cached is not None:
+                return cached, None
+
+        with timings.stage("embed"):
+            query_vector = await self._aembed_query(client, query)
+        if self.answer_cache:
+            cached = self.answer_cache.lookup_similar(query, namespace, query_vector)
+            if cached is not None:
+                return cached, query_vector
+        return None, query_vector
+
+    async def _aretrieve(self, query: str, query_vector, k: int) -> List:
+        # FAISS releases the GIL, so a worker thread keeps the event loop responsive on large indexes;
+        # `_retrieve` searches through the shared search batcher like the sync path
+        return await asyncio.to_thread(self._retrieve, query, query_vector, k)
+
+    async def aget_answer(self, client, query: str, temperature: float = None,
+                          llm_model: str = None, k: int = None, session_id: str = None) -> Dict:
+        """Async `get_answer`; `client` is an `ollama_client.AsyncOllamaClient`."""
+        tokens: List[str] = []
+        async for event in self.astream_answer(client, query, temperature, llm_model, k, session_id):
+            result = self._collect_answer(event, tokens)
+            if result is not None:
+                return result
+
+    async def astream_answer(self, client, query: str, temperature: float = None,
+                             llm_model: str = None, k: int = None,
+                             session_id: str = None) -> AsyncIterator[Dict]:
+        """Async `stream_answer`; yields the same event dicts."""
+        timings = RequestTimings()
+        try:
+            params = self._resolve_params(temperature, llm_model, k)
+            conversation = self._conversation(session_id)
+            history = conversation.history() if conversation else ""
+            question = query
+            if history:
+                with timings.stage("condense"):
+                    question = await self._acondense(client, params, history, query)
+
+            if history or self.flights is None:
+                events = self._aanswer_events(client, question, params, history, timings)
+            else:
+                events = self._acoalesced_events(client, question, params, timings)
+            tokens = []
+            async for event in events:
+                if event["type"] == "token":
+                    tokens.append(event["token"])
+                elif event["type"] == "done":
+                    self._finish_turn(conversation, question, "".join(tokens))
+                yield event
 
         except Exception as e:
-            print(f"Error getting answer: {str(e)}")
-            return {
-                "response": "I apologize, but I encountered an error. Please try again.",
-                "success": False,
-                "error": str(e)
+            print(f"Error streaming answer: {str(e)}")
+            yield self._error_event(e)
+
+    async def _agenerate_tokens(self, client, params: GenerationParams, prompt: str,
+                                timings: RequestTimings) -> AsyncIterator[str]:
+        count = 0
+        first_token_at = None
+        if params.fallbacks is not None:
+            stream = self._arouted_tokens(client, params, prompt, timings)
+        else:
+            stream = client.generate_stream(params.model, prompt, {"temperature": params.temperature})
+        async for token in stream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            count += 1
+            yield token
+        timings.record_generation(first_token_at, time.perf_counter(), count)
+
+    async def _arouted_tokens(self, client, params: GenerationParams, prompt: str,
+                              timings: RequestTimings) -> AsyncIterator[str]:
+        """Async `_routed_tokens`."""
+        candidates = [params.model, *params.fallbacks]
+        options = {"temperature": params.temperature}
+        for n, model in enumerate(candidates):
+            fallback = n + 1 < len(candidates)
+            started = time.perf_counter()
+            answered = False
+            try:
+                async for token in client.generate_stream(
+                        model, prompt, options,
+                        read_timeout=config.ROUTER_FIRST_TOKEN_TIMEOUT if fallback else None):
+                    if not answered:
+                        answered = True
+                        self.router.record_success(model, time.perf_counter() - started)
+                    yield token
+                if not answered:
+                    self.router.record_success(model, time.perf_counter() - started)
+                return
+            except Exception as e:
+                self.router.record_failure(model, ollama_client.is_timeout(e))
+                if answered or not fallback:
+                    raise
+                self._fall_back(model, candidates[n + 1], e, timings, started)
+
+    async def _aanswer_events(self, client, question: str, params: GenerationParams, history: str,
+                              timings: RequestTimings) -> AsyncIterator[Dict]:
+        """Async `_answer_events`."""
+        params = self._route(params, question)
+        cached, query_vector = await self._alookup_cached(client, question, params, timings)
+        if cached is not None:
+            for event in self._cached_events(cached, timings):
+                yield event
+            return
+
+        with timings.stage("search"):
+            docs = await self._aretrieve(question, query_vector, params.k)
+        yield {"type": "sources", "sources": self._describe_sources(docs)}
+
+        with timings.stage("prompt"):
+            prompt = self._build_prompt(question, docs, history)
+
+        tokens = []
+        async for token in self._agenerate_tokens(client, params, prompt, timings):
+            tokens.append(token)
+            yield {"type": "token", "token": token}
+
+        # Answers shaped by a conversation's history are not reused for other users
+        if not history:
+            self._store_cached(question, params, "".join(tokens), query_vector, timings)
+        ANSWERS.inc("llm")
+        yield {"type": "done", "success": True, "timings": timings.as_dict()}
+
+    async def _acoalesced_events(self, client, question: str, params: GenerationParams,
+                                 timings: RequestTimings) -> AsyncIterator[Dict]:
+        """Async `_coalesced_events`; the producer runs as a task on the event loop."""
+        params = self._route(params, question)
+        key, flight, leader = self._join_flight(question, params)
+        if leader:
+            events = self._aanswer_events(client, question, params, "", timings)
+            flight.task = asyncio.create_task(self.flights.arun(key, flight, events))
+        async for event in flight.afollow():
+            yield event if leader else self._follower_event(event, timings)
+
+    # ---- Batch runs (/chat/batch) ----
+
+    @staticmethod
+    def _batch_groups(items: List) -> "OrderedDict[str, List]":
+        """Batch items by normalized question, so each distinct question is answered once."""
+        groups: "OrderedDict[str, List]" = OrderedDict()
+        for item in items:
+            groups.setdefault(normalize_query(item.query), []).append(item)
+        return groups
+
+    def _batch_routes(self, groups, params: GenerationParams) -> Dict[str, GenerationParams]:
+        """Generation parameters per group key (routed per question when the router is on)."""
+        return {key: self._route(params, group[0].query) for key, group in groups.items()}
+
+    def _batch_cached(self, groups, routes: Dict[str, GenerationParams], query_vectors: Dict = None) -> Dict[str, str]:
+        """Cached answers by group key (exact lookups, or semantic ones when vectors are given)."""
+        found = {}
+        if not self.answer_cache:
+            return found
+        for key, group in groups.items():
+            namespace = (routes[key].model, routes[key].temperature)
+            if query_vectors is None:
+                answer = self.answer_cache.lookup_exact(group[0].query, namespace)
+            else:
+                answer = self.answer_cache.lookup_similar(group[0].query, namespace, query_vectors[key])
+            if answer is not None:
+                found[key] = answer
+        return found
+
+    def _cached_query_vectors(self, keys: List[str]) -> Dict:
+        return self.query_embeddings.get_many(keys) if self.query_embeddings is not None else {}
+
+    def _store_query_vectors(self, vectors: Dict) -> None:
+        if self.query_embeddings is not None and vectors:
+            self.query_embeddings.put_many(vectors.items())
+
+    def _embed_many(self, groups) -> Dict:
+        """Embedding per group key: persistent cache first, the rest in `QUERY_BATCH_MAX_SIZE` Ollama calls."""
+        vectors = self._cached_query_vectors(list(groups))
+        missing = [key for key in groups if key not in vectors]
+        embedded = {}
+        for start in range(0, len(missing), config.QUERY_BATCH_MAX_SIZE):
+            chunk = missing[start:start + config.QUERY_BATCH_MAX_SIZE]
+            embedded.update(zip(chunk, self._embed_batch([groups[key][0].query for key in chunk])))
+        self._store_query_vectors(embedded)
+        return {**vectors, **embedded}
+
+    async def _aembed_many(self, client, groups) -> Dict:
+        vectors = self._cached_query_vectors(list(groups))
+        missing = [key for key in groups if key not in vectors]
+        embedded = {}
+        for start in range(0, len(missing), config.QUERY_BATCH_MAX_SIZE):
+            chunk = missing[start:start + config.QUERY_BATCH_MAX_SIZE]
+            embedded.update(zip(chunk, await client.embed(self.embed_model, [groups[key][0].query for key in chunk])))
+        self._store_query_vectors(embedded)
+        return {**vectors, **embedded}
+
+    def _batch_work(self, groups, routes: Dict[str, GenerationParams], cached: Dict, vectors: Dict):
+        """Keys still to be answered after the semantic cache lookup, and their queries."""
+        cached.update(self._batch_cached(groups, routes, vectors))
+        todo = [key for key in groups if key not in cached]
+        return todo, [groups[key][0].query for key in todo]
+
+    def _batch_results(self, group: List, shared: RequestTimings, answer: str = None, docs: List = None,
+                       timings: RequestTimings = None, cached: bool = False, error: Exception = None) -> List[Dict]:
+        """One result line per item of a group; stage timings are the shared batch stages plus the item's own."""
+        stages = {k: v for k, v in shared.as_dict().items() if k != "total"}
+        if timings is not None:
+            stages.update((k, v) for k, v in timings.as_dict().items() if k != "total")
+        stages["total"] = round((time.perf_counter() - shared.started) * 1000, 2)
+        results = []
+        for n, item in enumerate(group):
+            result = {"id": item.id, "query": item.query}
+            if error is not None:
+                ANSWERS.inc("error")
+                result.update(success=False, error=str(error))
+            else:
+                ANSWERS.inc("cache" if cached else "llm" if n == 0 else "coalesced")
+                result.update(success=True, response=answer, timings=stages)
+                result["sources"] = self._describe_sources(docs) if docs else []
+                if cached:
+                    result["cached"] = True
+            results.append(result)
+        return results
+
+    def _batch_generate(self, params: GenerationParams, question: str, docs: List, query_vector,
+                        queued_at: float):
+        timings = RequestTimings()
+        timings.record("queue", timings.started - queued_at)
+        with timings.stage("prompt"):
+            prompt = self._build_prompt(question, docs)
+        answer = "".join(self._generate_tokens(params, prompt, timings))
+        self._store_cached(question, params, answer, query_vector, timings)
+        return answer, timings
+
+    def answer_batch(self, items: List, temperature: float = None, llm_model: str = None, k: int = None,
+                     max_parallel: int = None) -> Iterator[Dict]:
+        """Answer many questions; yields one result dict per item, in completion order.
+
+        `items` are `batch.BatchItem`s. Identical questions are answered once; the rest are embedded
+        together and retrieved with one matrix search, then generated at most `max_parallel` at a
+        time. Cached answers come out first. If the shared embed/search step fails, every item gets
+        an error result.
+        """
+        shared = RequestTimings()
+        try:
+            params = self._resolve_params(temperature, llm_model, k)
+            groups = self._batch_groups(items)
+            routes = self._batch_routes(groups, params)
+            cached = self._batch_cached(groups, routes)
+            pending = {key: group for key, group in groups.items() if key not in cached}
+            with shared.stage("embed"):
+                vectors = self._embed_many(pending)
+            todo, queries = self._batch_work(pending, routes, cached, vectors)
+            with shared.stage("search"):
+                docs = self._retrieve_many(queries, [vectors[key] for key in todo], params.k) if todo else []
+        except Exception as e:
+            print(f"Error preparing batch: {str(e)}")
+            for group in self._batch_groups(items).values():
+                yield from self._batch_results(group, shared, error=e)
+            return
+
+        for key, answer in cached.items():
+            yield from self._batch_results(groups[key], shared, answer, cached=True)
+
+        pool = ThreadPoolExecutor(max_workers=max_parallel or config.BATCH_MAX_PARALLEL, thread_name_prefix="batch")
+        try:
+            queued_at = time.perf_counter()
+            futures = {
+                pool.submit(self._batch_generate, routes[key], query, key_docs, vectors[key], queued_at): (key, key_docs)
+                for key, query, key_docs in zip(todo, queries, docs)
             }
+            for future in as_completed(futures):
+                key, key_docs = futures[future]
+                try:
+                    answer, timings = future.result()
+                except Exception as e:
+                    print(f"Error answering batch item: {str(e)}")
+                    yield from self._batch_results(groups[key], shared, error=e)
+                else:
+                    yield from self._batch_results(groups[key], shared, answer, key_docs, timings)
+        finally:
+            # Stop queued generations if the client went away
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _abatch_generate(self, client, params: GenerationParams, question: str, docs: List,
+                               query_vector, queued_at: float):
+        timings = RequestTimings()
+        timings.record("queue", timings.started - queued_at)
+        with timings.stage("prompt"):
+            prompt = self._build_prompt(question, docs)
+        answer = "".join([token async for token in self._agenerate_tokens(client, params, prompt, timings)])
+        self._store_cached(question, params, answer, query_vector, timings)
+        return answer, timings
+
+    async def aanswer_batch(self, client, items: List, temperature: float = None, llm_model: str = None,
+                            k: int = None, max_parallel: int = None) -> AsyncIterator[Dict]:
+        """Async `answer_batch`; generations run as tasks, at most `max_parallel` at a time."""
+        shared = RequestTimings()
+        try:
+            params = self._resolve_params(temperature, llm_model, k)
+            groups = self._batch_groups(items)
+            routes = self._batch_routes(groups, params)
+            cached = self._batch_cached(groups, routes)
+            pending = {key: group for key, group in groups.items() if key not in cached}
+            with shared.stage("embed"):
+                vectors = await self._aembed_many(client, pending)
+            todo, queries = self._batch_work(pending, routes, cached, vectors)
+            with shared.stage("search"):
+                docs = await asyncio.to_thread(self._retrieve_many, queries, [vectors[key] for key in todo],
+                                               params.k) if todo else []
+        except Exception as e:
+            print(f"Error preparing batch: {str(e)}")
+            for group in self._batch_groups(items).values():
+                for result in self._batch_results(group, shared, error=e):
+                    yield result
+            return
+
+        for key, answer in cached.items():
+            for result in self._batch_results(groups[key], shared, answer, cached=True):
+                yield result
+
+        slots = asyncio.Semaphore(max_parallel or config.BATCH_MAX_PARALLEL)
+        queued_at = time.perf_counter()
+
+        async def run(key, query, key_docs):
+            async with slots:
+                try:
+                    answer, timings = await self._abatch_generate(client, routes[key], query, key_docs,
+                                                                  vectors[key], queued_at)
+                except Exception as e:
+                    print(f"Error answering batch item: {str(e)}")
+                    return self._batch_results(groups[key], shared, error=e)
+                return self._batch_results(groups[key], shared, answer, key_docs, timings)
+
+        tasks = [asyncio.create_task(run(*work)) for work in zip(todo, queries, docs)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for result in await finished:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,189 @@
+"""Single-flight coalescing of identical concurrent requests.
+
+When several requests for the same key arrive while one is already being answered, only the first
+(the leader) starts the work. The work runs as a producer, detached from any one request, and every
+event it yields is recorded on a `Flight`. Each subscriber (the leader included) replays the events
+recorded so far and then follows the live ones, so a burst of identical streamed questions costs a
+single Ollama generation and every client still sees the tokens as they are produced.
+
+A flight is forgotten as soon as its producer finishes; later requests start a new one (and will
+usually hit the answer cache instead). If every subscriber leaves before the end (e.g. all clients
+disconnected), the producer stops early.
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterator, List, Tuple
+
+
+class FlightCancelled(Exception):
+    """Raised to a subscriber of a flight whose producer was stopped because nobody was listening."""
+
+
+class Flight:
+    """Events of one in-progress computation, replayed to every subscriber."""
+
+    def __init__(self):
+        self._events: List[Dict] = []
+        self._finished = False
+        self._error: Exception = None
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+        self.subscribers = 0  # changed under the owning `SingleFlight`'s lock, or `_cond`
+        self.task = None  # keeps an async producer task referenced
+
+    def publish(self, event: Dict) -> None:
+        with self._cond:
+            self._events.append(event)
+            self._notify()
+
+    def finish(self, error: Exception = None) -> None:
+        with self._cond:
+            self._finished = True
+            self._error = error
+            self._notify()
+
+    def _notify(self) -> None:
+        self._cond.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def _read(self, start: int) -> Tuple[List[Dict], bool]:
+        """Events from index `start` on, and whether they are the last ones."""
+        return self._events[start:], self._finished
+
+    def _leave(self) -> None:
+        with self._cond:
+            self.subscribers -= 1
+
+    def follow(self) -> Iterator[Dict]:
+        """Yield every event (past and future) of the flight; raises the producer's error at the end."""
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    while index == len(self._events) and not self._finished:
+                        self._cond.wait()
+                    events, finished = self._read(index)
+                index += len(events)
+                yield from events
+                if finished:
+                    if self._error is not None:
+                        raise self._error
+                    return
+        finally:
+            self._leave()
+
+    async def afollow(self) -> AsyncIterator[Dict]:
+        """Async `follow`; wakes up through the running event loop instead of blocking a thread."""
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+
+        def listener():
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # the subscriber's loop has been closed
+
+        with self._cond:
+            self._listeners.append(listener)
+        index = 0
+        try:
+            while True:
+                wake.clear()
+                with self._cond:
+                    events, finished = self._read(index)
+                index += len(events)
+                for event in events:
+                    yield event
+                if finished:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                if not events:
+                    await wake.wait()
+        finally:
+            with self._cond:
+                self._listeners.remove(listener)
+            self._leave()
+
+
+class SingleFlight:
+    """Registry of in-progress flights by key."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.cancelled = 0
+
+    def join(self, key: Hashable) -> Tuple[Flight, bool]:
+        """The flight for `key` and whether the caller is its leader (and must start the producer)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+            with flight._cond:
+                flight.subscribers += 1
+        return flight, leader
+
+    def _forget(self, key: Hashable, flight: Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _abandoned(self, key: Hashable, flight: Flight) -> bool:
+        """Forget the flight if nobody follows it any more; `join` cannot pick it up after this."""
+        with self._lock:
+            if flight.subscribers > 0:
+                return False
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self.cancelled += 1
+            return True
+
+    def run(self, key: Hashable, flight: Flight, events: Iterator[Dict]) -> None:
+        """Producer loop for a synchronous event source (run it on its own thread)."""
+        error = None
+        try:
+            for event in events:
+                flight.publish(event)
+                if self._abandoned(key, flight):
+                    events.close()
+                    error = FlightCancelled()
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            self._forget(key, flight)
+            flight.finish(error)
+
+    async def arun(self, key: Hashable, flight: Flight, events: AsyncIterator[Dict]) -> None:
+        """Producer loop for an async event source (run it as its own task)."""
+        error = None
+        try:
+            async for event in events:
+                flight.publish(event)
+                if self._abandoned(key, flight):
+                    await events.aclose()
+                    error = FlightCancelled()
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            self._forget(key, flight)
+            flight.finish(error)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "coalesced": self.followers,
+                "cancelled": self.cancelled
+            }
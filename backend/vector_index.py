@@ -0,0 +1,308 @@
+"""FAISS index construction and tuning shared by the index build, the retriever and the benchmarks.
+
+`config.FAISS_INDEX_TYPE` selects the index:
+- "flat"     exact brute-force L2 search (LangChain's default)
+- "ivf_flat" inverted lists over full vectors; searches `FAISS_NPROBE` of `FAISS_NLIST` lists
+- "ivf_pq"   inverted lists over product-quantized codes (`FAISS_PQ_M` bytes per vector)
+- "hnsw"     graph index (`FAISS_HNSW_M` links per node, `FAISS_EF_SEARCH` at query time)
+
+With `FAISS_SHARDS` > 1 the vectors are spread round-robin over that many indexes of the chosen
+type (`ShardedIndex`), each saved to its own file and searched in parallel; the chunk store and the
+BM25 postings stay whole, addressed by the global vector position.
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from docstore import MmapDocstore, PositionalIds, docstore_exists
+import config
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+MMAP_INDEX_TYPES = ("ivf_flat", "ivf_pq")  # FAISS ignores IO_FLAG_MMAP for flat and HNSW indexes
+INDEX_FILE = "index.faiss"
+SHARD_FILE = "index.shard-{:02d}.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+
+def needs_training(index_type: str) -> bool:
+    return index_type in ("ivf_flat", "ivf_pq")
+
+
+def default_nlist(num_vectors: int) -> int:
+    """Rule of thumb: ~4*sqrt(N) lists, keeping >= 39 training points per list."""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39 or 1))
+
+
+def index_params(index_type: str = None, num_train: int = 0) -> Dict:
+    """Resolve the build/search parameters for an index type from config."""
+    index_type = index_type or config.FAISS_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE '{index_type}', expected one of {INDEX_TYPES}")
+    params = {"type": index_type}
+    if needs_training(index_type):
+        params["nlist"] = config.FAISS_NLIST or default_nlist(num_train)
+        params["nprobe"] = config.FAISS_NPROBE
+    if index_type == "ivf_pq":
+        params["pq_m"] = config.FAISS_PQ_M
+    if index_type == "hnsw":
+        params["hnsw_m"] = config.FAISS_HNSW_M
+        params["ef_construction"] = config.FAISS_EF_CONSTRUCTION
+        params["ef_search"] = config.FAISS_EF_SEARCH
+    return params
+
+
+def build_index(dim: int, params: Dict, train_vectors: Optional[np.ndarray] = None) -> faiss.Index:
+    """Create an empty (and, for IVF types, trained) index for `dim`-dimensional vectors."""
+    index_type = params["type"]
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        if train_vectors is None:
+            raise ValueError(f"{index_type} index needs training vectors")
+        if index_type == "ivf_pq" and dim % params["pq_m"]:
+            raise ValueError(f"FAISS_PQ_M={params['pq_m']} must divide the embedding dimension {dim}")
+        if index_type == "ivf_pq" and len(train_vectors) < 256:
+            raise ValueError(f"ivf_pq needs at least 256 training vectors, got {len(train_vectors)}; use ivf_flat or flat")
+        spec = f"IVF{params['nlist']},Flat" if index_type == "ivf_flat" else f"IVF{params['nlist']},PQ{params['pq_m']}"
+        index = faiss.index_factory(dim, spec)
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+
+    set_search_params(index, params)
+    return index
+
+
+class ShardedIndex:
+    """Several FAISS indexes searched as one; global vector i lives in shard i % N at position i // N.
+
+    Implements the subset of the `faiss.Index` interface the app uses (`d`, `ntotal`, `add`,
+    `search`, `reconstruct_n`, `reconstruct_batch`). Shards are searched concurrently on a thread pool (FAISS releases the
+    GIL during a search) and their top-k lists merged by distance.
+    """
+
+    def __init__(self, shards: List[faiss.Index], threads: int = None):
+        if not shards:
+            raise ValueError("ShardedIndex needs at least one shard")
+        self.shards = shards
+        self.d = shards[0].d
+        self.metric_type = shards[0].metric_type
+        self._pool = ThreadPoolExecutor(max_workers=threads or len(shards), thread_name_prefix="faiss-shard")
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Append vectors, continuing the round-robin where the last add stopped."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(self.shards)
+        first = self.ntotal % n
+        for offset in range(n):
+            part = vectors[offset::n]
+            if len(part):
+                self.shards[(first + offset) % n].add(part)
+
+    def search(self, queries: np.ndarray, k: int):
+        """Top-k (distances, global ids) over all shards, like `faiss.Index.search`."""
+        n = len(self.shards)
+        futures = [self._pool.submit(shard.search, queries, k) for shard in self.shards]
+        distances, ids = [], []
+        for s, future in enumerate(futures):
+            shard_distances, shard_ids = future.result()
+            missing = shard_ids < 0
+            distances.append(np.where(missing, self._worst, shard_distances))
+            ids.append(np.where(missing, -1, shard_ids * n + s))
+        distances, ids = np.hstack(distances), np.hstack(ids)
+        order = np.argsort(-distances if self._larger_is_better else distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    @property
+    def _larger_is_better(self) -> bool:
+        return self.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    @property
+    def _worst(self) -> float:
+        return -np.inf if self._larger_is_better else np.inf
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        """Vectors `start .. start+count` in global order (shards must support reconstruction)."""
+        vectors = np.empty((self.ntotal, self.d), dtype=np.float32)
+        n = len(self.shards)
+        for s, shard in enumerate(self.shards):
+            vectors[s::n] = shard.reconstruct_n(0, shard.ntotal)
+        return vectors[start:start + count]
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        """Vectors of the given global ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.empty((len(ids), self.d), dtype=np.float32)
+        n = len(self.shards)
+        for s, shard in enumerate(self.shards):
+            mask = ids % n == s
+            if mask.any():
+                vectors[mask] = shard.reconstruct_batch(ids[mask] // n)
+        return vectors
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def make_sharded(index: faiss.Index, num_shards: int):
+    """`index` itself for one shard, else a `ShardedIndex` of `num_shards` empty copies of it.
+
+    The copies share the (already trained) quantizer state, so IVF shards are trained only once.
+    """
+    if num_shards <= 1:
+        return index
+    return ShardedIndex([faiss.clone_index(index) for _ in range(num_shards)])
+
+
+def num_shards(index) -> int:
+    return len(index.shards) if isinstance(index, ShardedIndex) else 1
+
+
+def set_search_params(index: faiss.Index, params: Dict = None) -> None:
+    """Apply query-time knobs (nprobe / efSearch) to a freshly built or loaded index."""
+    if isinstance(index, ShardedIndex):
+        for shard in index.shards:
+            set_search_params(shard, params)
+        return
+    params = params or index_params(describe_index(index))
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None and params.get("nprobe"):
+        ivf.nprobe = min(params["nprobe"], ivf.nlist)
+    if hasattr(index, "hnsw") and params.get("ef_search"):
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def enable_reconstruction(index: faiss.Index) -> None:
+    """Let `reconstruct_vectors` read vectors back; IVF indexes need an id -> list map for that."""
+    if isinstance(index, ShardedIndex):
+        for shard in index.shards:
+            enable_reconstruction(shard)
+        return
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.make_direct_map()
+
+
+def reconstruct_vectors(index, ids: List[int]) -> np.ndarray:
+    """Stored vectors of `ids` (exact for flat/HNSW/IVF-flat, decoded approximations for IVF-PQ)."""
+    return index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+
+
+def describe_index(index: faiss.Index) -> str:
+    """Map a loaded FAISS index back to its `FAISS_INDEX_TYPE` name."""
+    if isinstance(index, ShardedIndex):
+        return describe_index(index.shards[0])
+    if hasattr(index, "hnsw"):
+        return "hnsw"
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return "flat"
+    return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+
+
+def describe_params(index: faiss.Index) -> Dict:
+    """`index_params` for a built index, with the IVF parameters it actually uses."""
+    if isinstance(index, ShardedIndex):
+        return describe_params(index.shards[0])
+    params = index_params(describe_index(index))
+    if needs_training(params["type"]):
+        ivf = faiss.extract_index_ivf(index)
+        params["nlist"] = int(ivf.nlist)
+        params["nprobe"] = int(ivf.nprobe)
+        if params["type"] == "ivf_pq":
+            params["pq_m"] = int(faiss.downcast_index(ivf).pq.M)
+    return params
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Approximate resident size of an index (its serialized size)."""
+    if isinstance(index, ShardedIndex):
+        return sum(index_memory_bytes(shard) for shard in index.shards)
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def _index_files(num_shards: int) -> List[str]:
+    return [INDEX_FILE] if num_shards <= 1 else [SHARD_FILE.format(s) for s in range(num_shards)]
+
+
+def write_index(index, index_dir: str) -> None:
+    """Persist an index (one file per shard) next to its docstore, each written aside and renamed into place.
+
+    Which files make up the index is recorded in `meta.json` ("shards"), written after this.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    shards = index.shards if isinstance(index, ShardedIndex) else [index]
+    for shard, name in zip(shards, _index_files(len(shards))):
+        path = os.path.join(index_dir, name)
+        faiss.write_index(shard, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def _read_file(path: str, mmap: bool) -> faiss.Index:
+    if mmap:
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"⚠️ Could not memory-map {path} ({e}); loading it into RAM")
+        else:
+            index_type = describe_index(index)
+            if index_type not in MMAP_INDEX_TYPES:
+                print(f"ℹ️ {path}: FAISS cannot memory-map '{index_type}' indexes; loaded into RAM "
+                      f"({index.ntotal} vectors)")
+            return index
+    return faiss.read_index(path)
+
+
+def read_index(index_dir: str, mmap: bool = True, shards: int = 1):
+    """Load the index (a `ShardedIndex` when `shards` > 1), memory-mapped read-only when `mmap` is set.
+
+    Only IVF indexes (`MMAP_INDEX_TYPES`) are really mapped: they open without reading their
+    inverted lists and share page cache between worker processes. FAISS reads flat and HNSW indexes
+    fully into each process's RAM whatever the flag says.
+    """
+    indexes = [_read_file(os.path.join(index_dir, name), mmap) for name in _index_files(shards)]
+    return indexes[0] if shards <= 1 else ShardedIndex(indexes)
+
+
+def load_vectorstore(index_dir: str, embeddings, shards: int = 1) -> FAISS:
+    """Open the index and docstore in `index_dir` as a LangChain FAISS vectorstore (no unpickling)."""
+    if not docstore_exists(index_dir):
+        if os.path.exists(os.path.join(index_dir, LEGACY_DOCSTORE_FILE)):
+            raise RuntimeError(
+                f"{index_dir} only has a legacy pickle docstore; convert it with "
+                "`python backend/data_preparation.py --convert-legacy` or rebuild the index"
+            )
+        raise RuntimeError(f"No index found in {index_dir}; run `python backend/data_preparation.py`")
+
+    index = read_index(index_dir, shards=shards)
+    docstore = MmapDocstore(index_dir)
+    if len(docstore) != index.ntotal:
+        raise RuntimeError(f"Index has {index.ntotal} vectors but docstore has {len(docstore)} chunks; rebuild the index")
+    set_search_params(index)
+    if config.MMR_ENABLED:
+        enable_reconstruction(index)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=PositionalIds(index.ntotal)
+    )
@@ -0,0 +1,81 @@
+"""Keep the Ollama models the app depends on loaded, so no chat pays a cold model load.
+
+`ModelWarmer.warm()` loads one model synchronously (used before a model switch is published);
+`start()` warms the embedding model, the active LLM and any preloaded LLMs in a background thread
+and then re-issues the load call every `refresh_seconds`. A load call on a resident model is cheap
+and renews its keep-alive, and it reloads the model if Ollama was restarted in the meantime.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List
+
+import ollama_client
+
+
+class ModelWarmer:
+    """Load models into Ollama ahead of use and track their readiness."""
+
+    def __init__(self, base_url: str, embed_model: str, keep_alive=None, refresh_seconds: float = 0):
+        self.base_url = base_url
+        self.embed_model = embed_model
+        self.keep_alive = keep_alive
+        self.refresh_seconds = refresh_seconds
+        # model -> {"status": "loading" | "ready" | "error", "load_ms": ..., "error": ...}
+        self._status: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._first_pass = threading.Event()
+
+    def _set_status(self, model: str, **fields) -> None:
+        with self._lock:
+            self._status[model] = {**self._status.get(model, {}), **fields}
+
+    def warm(self, model: str) -> float:
+        """Load `model` and wait until it is resident; returns the load time in seconds. Raises on failure."""
+        if self._status.get(model, {}).get("status") != "ready":
+            self._set_status(model, status="loading")
+        start = time.perf_counter()
+        try:
+            ollama_client.load_model(self.base_url, model, keep_alive=self.keep_alive,
+                                     embedding=model == self.embed_model)
+        except Exception as e:
+            self._set_status(model, status="error", error=str(e))
+            raise
+        seconds = time.perf_counter() - start
+        self._set_status(model, status="ready", load_ms=round(seconds * 1000, 1), error=None,
+                         warmed_at=time.time())
+        return seconds
+
+    def warm_all(self, models: List[str]) -> None:
+        """Warm each model in turn, logging (not raising) failures."""
+        for model in dict.fromkeys(models):
+            try:
+                seconds = self.warm(model)
+                print(f"🔥 {model} ready ({seconds * 1000:.0f} ms)")
+            except Exception as e:
+                print(f"⚠️ Could not warm up {model}: {e}")
+
+    def start(self, models: Callable[[], List[str]]) -> None:
+        """Warm `models()` in a background thread, then keep them warm every `refresh_seconds` (0 = once)."""
+        def run():
+            while True:
+                self.warm_all(models())
+                self._first_pass.set()
+                if not self.refresh_seconds:
+                    return
+                time.sleep(self.refresh_seconds)
+
+        self._thread = threading.Thread(target=run, name="model-warmer", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the first warm-up pass started by `start()` has finished (False on timeout)."""
+        return self._first_pass.wait(timeout)
+
+    def is_ready(self, model: str) -> bool:
+        return self._status.get(model, {}).get("status") == "ready"
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {model: dict(status) for model, status in self._status.items()}
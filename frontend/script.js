@@ -14,6 +14,11 @@ document.addEventListener("DOMContentLoaded", () => {
     // Track selection locally - declare early before fetchModels is called
     let currentSelected = [];
 
+    // One conversation per page load, so follow-up questions keep their context
+    const sessionId = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
     // Initial welcome
     addMessage(
         "Hello! I'm your medical assistant 🤖. How can I help you today?",
@@ -272,25 +277,21 @@ document.addEventListener("DOMContentLoaded", () => {
         const loadingId = addLoadingIndicator();
 
         try {
-            const response = await fetch("/chat", {
+            const response = await fetch("/chat/stream", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ query, temperature: 0.7 }),
+                body: JSON.stringify({ query, temperature: 0.7, session_id: sessionId }),
             });
 
-            const data = await response.json();
-            removeLoadingIndicator(loadingId);
-
-            if (data.success) {
-                const botReply =
-                    typeof data.response === "string"
-                        ? data.response
-                        : JSON.stringify(data.response, null, 2);
-
-                // ✅ call instant fast typer
-                typeMessageFast(botReply, "bot");
+            if (!response.ok) {
+                // Busy (429/503) or invalid request (400): show why instead of retrying
+                removeLoadingIndicator(loadingId);
+                addMessage("⚠️ " + await errorMessage(response), "bot");
+            } else if (!response.body) {
+                // Older browsers without streaming fetch: fall back to the blocking endpoint
+                await fetchFullAnswer(query, loadingId);
             } else {
-                addMessage("⚠️ Something went wrong. Please try again.", "bot");
+                await renderStream(response, loadingId);
             }
         } catch (error) {
             console.error("Error:", error);
@@ -303,6 +304,94 @@ document.addEventListener("DOMContentLoaded", () => {
         userInput.focus();
     }
 
+    // Render server-sent events from /chat/stream token by token
+    async function renderStream(response, loadingId) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let messageDiv = null;
+        let failed = false;
+
+        const handleEvent = (event) => {
+            if (event.type === "token") {
+                if (!messageDiv) {
+                    removeLoadingIndicator(loadingId);
+                    messageDiv = document.createElement("div");
+                    messageDiv.className = "message bot-message";
+                    chatMessages.appendChild(messageDiv);
+                }
+                messageDiv.textContent += event.token;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            } else if (event.type === "sources") {
+                console.log("📚 Retrieved sources:", event.sources);
+            } else if (event.type === "error") {
+                console.error("❌ Stream error:", event.error);
+                failed = true;
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                raw.split("\n")
+                    .filter(line => line.startsWith("data: "))
+                    .forEach(line => handleEvent(JSON.parse(line.slice(6))));
+            }
+        }
+
+        removeLoadingIndicator(loadingId);
+        if (!messageDiv) {
+            addMessage("⚠️ Something went wrong. Please try again.", "bot");
+        } else if (failed) {
+            messageDiv.textContent += "\n\n⚠️ The answer was interrupted. Please try again.";
+        }
+    }
+
+    // Keeps the loading indicator up until the answer (or error) is ready to show
+    async function fetchFullAnswer(query, loadingId) {
+        const response = await fetch("/chat", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ query, temperature: 0.7, session_id: sessionId }),
+        });
+        removeLoadingIndicator(loadingId);
+        if (!response.ok) {
+            addMessage("⚠️ " + await errorMessage(response), "bot");
+            return;
+        }
+        const data = await response.json();
+
+        if (data.success) {
+            const botReply =
+                typeof data.response === "string"
+                    ? data.response
+                    : JSON.stringify(data.response, null, 2);
+
+            // ✅ call instant fast typer
+            typeMessageFast(botReply, "bot");
+        } else {
+            addMessage("⚠️ " + (data.error || "Something went wrong. Please try again."), "bot");
+        }
+    }
+
+    // The server's `error` field, or a generic message when the body is not JSON
+    async function errorMessage(response) {
+        try {
+            const data = await response.json();
+            if (data && data.error) return data.error;
+        } catch (parseErr) {
+            console.error("❌ Error response is not JSON:", parseErr);
+        }
+        return "Something went wrong (" + response.status + "). Please try again.";
+    }
+
     function addMessage(text, sender) {
         const messageDiv = document.createElement("div");
         messageDiv.className = `message ${sender}-message`;
@@ -0,0 +1,6 @@
+"""Import the backend modules as top-level modules, the way the servers and scripts run them."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
@@ -0,0 +1,107 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import live_index
+import retriever
+from answer_cache import SemanticAnswerCache, normalize_query
+
+
+NS = ("llama3.2:1b", 0.7)
+
+
+def _vector(angle: float) -> np.ndarray:
+    """A unit vector at `angle` radians from [1, 0, 0] (cosine similarity = cos(angle))."""
+    return np.array([np.cos(angle), np.sin(angle), 0.0], dtype=np.float32)
+
+
+def test_normalize_query_ignores_case_punctuation_and_spacing():
+    assert normalize_query("  What is  Aspirin?? ") == normalize_query("what is aspirin")
+
+
+def test_exact_lookup_matches_normalized_text():
+    cache = SemanticAnswerCache()
+    cache.store("What is aspirin?", NS, "An NSAID.", _vector(0))
+    assert cache.lookup_exact("what is ASPIRIN", NS) == "An NSAID."
+    assert cache.lookup_exact("what is ibuprofen", NS) is None
+
+
+def test_similar_lookup_respects_threshold():
+    cache = SemanticAnswerCache(similarity_threshold=0.9)
+    cache.store("What is aspirin?", NS, "An NSAID.", _vector(0))
+    # cos(0.4) ~ 0.92 is close enough, cos(0.5) ~ 0.88 is not
+    assert cache.lookup_similar("Tell me about aspirin", NS, _vector(0.4)) == "An NSAID."
+    assert cache.lookup_similar("Tell me about heparin", NS, _vector(0.5)) is None
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 1)
+
+
+def test_answers_are_namespaced_by_model_and_temperature():
+    cache = SemanticAnswerCache()
+    cache.store("What is aspirin?", NS, "An NSAID.", _vector(0))
+    for other in (("gemma3:1b", 0.7), ("llama3.2:1b", 0.2)):
+        assert cache.lookup_exact("What is aspirin?", other) is None
+        assert cache.lookup_similar("What is aspirin?", other, _vector(0)) is None
+    assert cache.lookup_exact("What is aspirin?", NS) == "An NSAID."
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store("a", NS, "A")
+    cache.store("b", NS, "B")
+    cache.lookup_exact("a", NS)
+    cache.store("c", NS, "C")
+    assert cache.lookup_exact("b", NS) is None
+    assert cache.lookup_exact("a", NS) == "A"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_not_served():
+    cache = SemanticAnswerCache(ttl_seconds=0)
+    cache.store("What is aspirin?", NS, "An NSAID.", _vector(0))
+    assert cache.lookup_exact("What is aspirin?", NS) is None
+    assert cache.lookup_similar("What is aspirin?", NS, _vector(0)) is None
+
+
+class _FakeIndex:
+    def __init__(self, version: str, dim: int = 3):
+        self.version = version
+        self.dim = dim
+        self.retired = False
+        self.vectorstore = SimpleNamespace(index=SimpleNamespace(ntotal=3))
+
+    def warm(self, queries: int) -> None:
+        pass
+
+    def retire(self) -> None:
+        self.retired = True
+
+
+def _retriever_with_cache(monkeypatch, new_index: _FakeIndex):
+    r = retriever.MedicalRetriever.__new__(retriever.MedicalRetriever)
+    r.embeddings, r.embed_model = None, "nomic-embed-text"
+    r._index = _FakeIndex("v1")
+    r._reload_lock = threading.Lock()
+    r.index_reloads = 0
+    r.answer_cache = SemanticAnswerCache()
+    r.answer_cache.store("What is aspirin?", NS, "An NSAID.", _vector(0))
+    monkeypatch.setattr(live_index, "load_index", lambda *args, **kwargs: new_index)
+    return r
+
+
+def test_index_reload_clears_cached_answers(monkeypatch):
+    r = _retriever_with_cache(monkeypatch, _FakeIndex("v2"))
+    r.reload_index()
+    assert r.answer_cache.lookup_exact("What is aspirin?", NS) is None
+    assert r.index_version == "v2"
+
+
+def test_rejected_reload_keeps_cached_answers(monkeypatch):
+    new = _FakeIndex("v2", dim=4)
+    r = _retriever_with_cache(monkeypatch, new)
+    with pytest.raises(live_index.IndexValidationError):
+        r.reload_index()
+    assert new.retired
+    assert r.answer_cache.lookup_exact("What is aspirin?", NS) == "An NSAID."
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def _submit_all(batcher: MicroBatcher, items):
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(batcher.submit, items))
+
+
+def test_results_come_back_to_their_callers():
+    batcher = MicroBatcher(lambda items: [item * 10 for item in items], max_batch_size=4, max_wait_ms=20)
+    assert _submit_all(batcher, list(range(10))) == [item * 10 for item in range(10)]
+
+
+def test_queued_items_are_split_into_batches_of_at_most_max_batch_size():
+    release = threading.Event()
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=3, max_wait_ms=1)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        first = pool.submit(batcher.submit, "blocker")
+        while not batches:
+            time.sleep(0.001)
+        # Queued while the worker is busy with the first batch
+        futures = [pool.submit(batcher.submit, i) for i in range(7)]
+        while batcher._queue.qsize() < 7:
+            time.sleep(0.001)
+        release.set()
+        assert first.result() == "blocker"
+        assert sorted(f.result() for f in futures) == list(range(7))
+
+    assert [len(batch) for batch in batches] == [1, 3, 3, 1]
+    assert batcher.stats() == {"batches": 4, "items": 8, "avg_batch_size": 2.0}
+
+
+def test_a_failing_batch_raises_in_every_caller_and_the_worker_keeps_going():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        if "bad" in items:
+            raise ValueError("boom")
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=1)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        first = pool.submit(batcher.submit, "blocker")
+        while batcher._queue.qsize():
+            time.sleep(0.001)
+        futures = [pool.submit(batcher.submit, item) for item in ("ok", "bad")]
+        while batcher._queue.qsize() < 2:
+            time.sleep(0.001)
+        release.set()
+        assert first.result() == "blocker"
+        for future in futures:
+            with pytest.raises(ValueError, match="boom"):
+                future.result()
+    assert batcher.submit("ok") == "ok"
+
+
+def test_wrong_number_of_results_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="0 results for 1 items"):
+        batcher.submit("x")